@@ -0,0 +1,205 @@
+"""
+Anna AI Assistant - Action Parser
+Incremental extraction of JSON actions and prose from a streamed model reply
+"""
+
+import json
+import re
+
+
+FENCE_PATTERN = re.compile(r"```(?:json)?[ \t]*\n?")
+DECODER = json.JSONDecoder()
+# Characters that can change scanner state inside an object / inside a JSON string
+OBJECT_SPECIAL = re.compile(r'[{}"]')
+STRING_SPECIAL = re.compile(r'["\\]')
+NON_SPACE = re.compile(r"\S")
+
+
+class StreamingActionParser:
+    """Feed reply chunks in; get ("text", str) and ("action", dict) events out
+
+    Brace depth is tracked outside of JSON strings, so a "}" inside a value does not
+    end the object. A "{" that turns out not to start JSON (not followed by a key, never
+    balanced, or not decodable) is kept as prose and scanning resumes right after it.
+    Code fences around the JSON are dropped from the text.
+    """
+    
+    def __init__(self):
+        self._text = ""       # prose not yet emitted
+        self._object = []     # characters of the JSON object being read
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._expect_key = False  # just after a "{": only a key or "}" may follow
+    
+    def feed(self, chunk):
+        """Consume a chunk and return the events it completed"""
+        events = []
+        pos = 0
+        # Jump between the characters that matter instead of stepping one at a time
+        while pos < len(chunk):
+            if self._depth == 0:
+                brace = chunk.find("{", pos)
+                if brace < 0:
+                    self._text += chunk[pos:]
+                    break
+                self._text += chunk[pos:brace]
+                self._emit_text(events, final=True)
+                
+                # Common case: the whole object is already here, so decode it in one go
+                try:
+                    data, end = DECODER.raw_decode(chunk, brace)
+                except ValueError:
+                    data = None
+                if isinstance(data, dict):
+                    self._add_object(events, data, chunk[brace:end])
+                    pos = end
+                    continue
+                
+                self._object = ["{"]
+                self._depth = 1
+                self._expect_key = True
+                pos = brace + 1
+                continue
+            
+            if self._expect_key:
+                # A JSON object opens with a key or closes at once; anything else is prose
+                match = NON_SPACE.search(chunk, pos)
+                if not match:
+                    self._object.append(chunk[pos:])
+                    break
+                self._object.append(chunk[pos:match.start()])
+                pos = match.start()
+                self._expect_key = False
+                if chunk[pos] not in '"}':
+                    chunk = self._back_to_prose() + chunk[pos:]
+                    pos = 0
+                continue
+            
+            if self._escaped:
+                # The character after a backslash (possibly in the next chunk) is literal
+                self._object.append(chunk[pos])
+                self._escaped = False
+                pos += 1
+                continue
+            
+            match = (STRING_SPECIAL if self._in_string else OBJECT_SPECIAL).search(chunk, pos)
+            if not match:
+                self._object.append(chunk[pos:])
+                break
+            char = match.group()
+            self._object.append(chunk[pos:match.end()])
+            pos = match.end()
+            
+            if self._in_string:
+                if char == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+                self._expect_key = True
+            else:
+                self._depth -= 1
+                if self._depth == 0 and not self._finish_object(events):
+                    chunk = self._back_to_prose() + chunk[pos:]
+                    pos = 0
+        
+        self._emit_text(events)
+        return events
+    
+    def close(self):
+        """End of stream: flush held-back text and any unterminated object as text"""
+        events = []
+        # An object still open never balanced: its "{" was prose, the rest may hold actions
+        while self._depth:
+            events.extend(self.feed(self._back_to_prose()))
+        self._emit_text(events, final=True)
+        return events
+    
+    def _finish_object(self, events):
+        """Parse a balanced object; False (object kept for a rescan) if it isn't JSON"""
+        raw = "".join(self._object)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return False
+        self._object = []
+        self._add_object(events, data, raw)
+        return True
+    
+    def _back_to_prose(self):
+        """Give up on the object being read: its "{" becomes text; returns the rest to rescan"""
+        raw = "".join(self._object)
+        self._object = []
+        self._depth = 0
+        self._in_string = self._escaped = self._expect_key = False
+        self._text += "{"
+        return raw[1:]
+    
+    def _add_object(self, events, data, raw):
+        """Emit an action; anything that isn't one is kept as text"""
+        if isinstance(data, dict) and "action" in data:
+            events.append(("action", data))
+        else:
+            self._text += raw
+    
+    def _emit_text(self, events, final=False):
+        """Emit buffered prose, holding back a possible partial code fence"""
+        text = self._text
+        keep = ""
+        if not final:
+            # "`", "``", "```" or "```js" at the end may still become a fence
+            tail = re.search(r"`{1,3}(?:j(?:s(?:o(?:n)?)?)?)?[ \t]*$", text)
+            if tail:
+                keep = text[tail.start():]
+                text = text[:tail.start()]
+        self._text = keep
+        text = FENCE_PATTERN.sub("", text)
+        if text:
+            events.append(("text", text))
+
+
+def parse_reply(text):
+    """Split a complete reply into (actions, prose) in one pass
+
+    actions lists every action object in order (possibly none); prose is the text
+    around them, with code fences and JSON array punctuation ("[", ",", "]") removed.
+    """
+    parser = StreamingActionParser()
+    actions = []
+    segments = [""]  # text between actions
+    for kind, value in parser.feed(text or "") + parser.close():
+        if kind == "action":
+            actions.append(value)
+            segments.append("")
+        else:
+            segments[-1] += value
+    
+    prose = []
+    for index, segment in enumerate(segments):
+        if index > 0:
+            segment = segment.lstrip(" \t\r\n,]")
+        if index < len(segments) - 1:
+            segment = segment.rstrip(" \t\r\n,[")
+        if segment.strip():
+            prose.append(segment.strip())
+    return actions, "\n".join(prose)
+
+
+def normalize_deps(step, index):
+    """A step's "depends_on" as a list of earlier step indexes
+
+    The model sometimes writes a bare index ("depends_on": 1) instead of a list; that is
+    wrapped, other values are dropped, and only indexes below `index` (the step's own
+    position) are kept, so a step can never wait on itself or a later step.
+    """
+    deps = step.get("depends_on")
+    if isinstance(deps, int):
+        deps = [deps]
+    if not isinstance(deps, list):
+        return []
+    return [dep for dep in deps
+            if isinstance(dep, int) and not isinstance(dep, bool) and 0 <= dep < index]
@@ -3,25 +3,34 @@ Anna AI Assistant - Brain (Command Interpreter)
 Natural language processing via Gemini API
 """
 
+import hashlib
 import json
-import google.generativeai as genai
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from config import config
 from memory import memory
 from safety import safety
 from logger import logger
+from context_cache import context_cache
+from prompt_assembler import prompt_assembler, estimate_tokens
+from intent_parser import intent_parser
+from response_cache import response_cache
+from action_parser import StreamingActionParser, parse_reply, normalize_deps
+from resilience import resilient_llm, LLMUnavailableError
+from model_router import model_router
+from metrics import request_metrics, elapsed_ms
 
 
 class AnnaBrain:
     """Anna's AI brain for natural language understanding"""
     
     def __init__(self):
-        # Configure Gemini
-        if config.gemini_api_key:
-            genai.configure(api_key=config.gemini_api_key)
-            # Use gemini-2.5-flash (confirmed available)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.model = None
+        # Model calls go through the configured backend (Gemini, replay or local server),
+        # with deadlines, retries and a circuit breaker in front of it
+        self.llm = resilient_llm
+        if not self.llm.available:
             logger.log_error("GEMINI_CONFIG", "No API key found", "Check .env file")
         
         # Personality modes
@@ -31,13 +40,90 @@ class AnnaBrain:
             "friendly": "You are warm, friendly, and casual in all responses.",
             "jarvis": "You are like Jarvis from Iron Man - formal, intelligent, and efficient."
         }
+        
+        # Static instructions go out as a system instruction (server-cached when possible);
+        # only context and the user turn are sent per request
+        self.token_stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "single_prompt_tokens": 0}
+        # Batches record usage from several threads
+        self._stats_lock = threading.Lock()
     
-    def _build_system_prompt(self):
-        """Build the system prompt for Anna"""
+    def _instructions(self):
+        """Static instructions for the current personality (rendered once per personality)"""
         personality = config.settings.get("preferences", {}).get("personality", "adaptive")
+        return context_cache.get("personality", personality,
+                                 lambda: self._render_instructions(personality))
+    
+    def _prepare_request(self, user_input, snapshot=None):
+        """Instructions for the current personality plus the per-turn prompt
+
+        snapshot is a packed (context, report) shared by a batch; without one the
+        context is packed for this input. Returns (instructions, turn_prompt,
+        single_prompt_tokens), the last being the estimated size of the old
+        all-in-one prompt, kept for the token comparison.
+        """
+        instructions = self._instructions()
+        
+        # Whatever the instructions and the user turn leave over goes to context
+        fixed_tokens = estimate_tokens(instructions) + estimate_tokens(f"User: {user_input or ''}") + 8
+        if snapshot is None:
+            snapshot = prompt_assembler.pack(
+                memory.build_context_sections(user_input),
+                config.prompt_token_budget - fixed_tokens
+            )
+        context, report = snapshot
+        
+        total_tokens = fixed_tokens + report["tokens"]
+        logger.log_debug(
+            f"Prompt tokens: {total_tokens}/{config.prompt_token_budget} | "
+            f"context {report['sections']} | truncated {report['truncated']} | "
+            f"dropped {report['dropped']}"
+        )
+        
+        turn_prompt = f"CONTEXT:\n{context}\n\nUser: {user_input}\n\nAnna:"
+        return instructions, turn_prompt, total_tokens
+    
+    def _record_usage(self, usage, single_prompt_tokens, record):
+        """Track input tokens actually billed against the old single-prompt estimate"""
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+        record.update({
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+            "prompt_estimate": single_prompt_tokens,
+        })
+        with self._stats_lock:
+            self.token_stats["requests"] += 1
+            self.token_stats["prompt_tokens"] += prompt_tokens
+            self.token_stats["cached_tokens"] += cached_tokens
+            self.token_stats["single_prompt_tokens"] += single_prompt_tokens
+        logger.log_debug(
+            f"Input tokens: {prompt_tokens} ({cached_tokens} cached, "
+            f"{prompt_tokens - cached_tokens} new) | single prompt before split: ~{single_prompt_tokens}"
+        )
+    
+    def _context_fingerprint(self):
+        """Hash of the context a cached reply depends on (not the running conversation)"""
+        settings = config.settings
+        state = [
+            settings.get("preferences", {}).get("personality", "adaptive"),
+            sorted(settings.get("learned_apps", {})),
+            sorted(settings.get("learned_games", {})),
+            sorted(settings.get("learned_documents", {})),
+            memory.session_context,
+        ]
+        return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def _conversation_fingerprint(self, turns=3):
+        """Hash of the last few exchanges, for replies that only make sense after them"""
+        recent = [(exchange.user, exchange.anna) for exchange in memory.current_conversation.recent(turns)]
+        return hashlib.sha1(json.dumps(recent).encode('utf-8')).hexdigest()
+    
+    def _render_instructions(self, personality):
+        """Render the static instructions for a personality"""
         personality_style = self.personality_prompts.get(personality, self.personality_prompts["adaptive"])
         
-        prompt = f"""You are Anna, an advanced AI assistant running locally on Windows 10/11.
+        return f"""You are Anna, an advanced AI assistant running locally on Windows 10/11.
 
 PERSONALITY:
 {personality_style}
@@ -81,6 +167,10 @@ For actions:
   "additional_params": "if_needed"
 }}
 
+For requests with several steps, output one JSON object per step, in order.
+Steps run at the same time unless a step lists the earlier steps it needs,
+counting from 0, e.g. "depends_on": [0].
+
 After JSON, optionally add a brief natural response.
 
 For conversation only:
@@ -88,111 +178,357 @@ For conversation only:
   "action": "none"
 }}
 Then provide your conversational response.
-
-CONTEXT:
-{memory.build_context_string()}
 """
-        return prompt
     
-    def process(self, user_input):
-        """Process user input and return response + action"""
+    def process(self, user_input, snapshot=None):
+        """Process user input and return response + actions"""
+        request_started = time.perf_counter()
+        record = {"stream": False}
         try:
-            # Check if model is configured
-            if not self.model:
-                return {
-                    "response": "I'm not properly configured. Please set your GEMINI_API_KEY in the .env file.",
-                    "action": None,
-                    "needs_pin": False
-                }
+            local = self._answer_locally(user_input)
+            if local["result"]:
+                return self._finish(record, request_started, local["outcome"], local["result"])
             
             # Build prompt
-            system_prompt = self._build_system_prompt()
-            full_prompt = f"{system_prompt}\n\nUser: {user_input}\n\nAnna:"
+            build_started = time.perf_counter()
+            instructions, turn_prompt, single_prompt_tokens = self._prepare_request(user_input, snapshot)
+            record["prompt_build_ms"] = elapsed_ms(build_started)
             
-            # Generate response
-            response = self.model.generate_content(full_prompt)
-            response_text = response.text.strip()
+            # Generate response on the model tier the request needs
+            route = model_router.route(user_input)
+            record.update(tier=route["tier"], model=route["model"])
+            started = time.perf_counter()
+            response = self.llm.generate(turn_prompt, system_instruction=instructions, model=route["model"])
+            elapsed = time.perf_counter() - started
+            record["model_ms"] = round(elapsed * 1000, 1)
+            intent_parser.record_model_latency(elapsed)
+            model_router.record(route, elapsed)
+            self._record_usage(getattr(response, "usage_metadata", None), single_prompt_tokens, record)
             
-            # Extract JSON if present
-            action_data = self._extract_json(response_text)
-            
-            # Get natural language response (text after JSON or full text if no JSON)
-            natural_response = self._extract_natural_response(response_text)
+            # Every action object in the reply, plus the prose around them
+            parse_started = time.perf_counter()
+            actions, natural_response = parse_reply(response.text.strip())
+            actions = [action for action in actions if action.get("action") != "none"]
+            record["parse_ms"] = round((time.perf_counter() - parse_started) * 1000, 3)
             
             # Check if dangerous
-            needs_pin = False
-            if action_data and action_data.get("action") != "none":
-                action_type = action_data.get("action")
-                needs_pin = safety.requires_pin(user_input, action_type)
-                
-                if needs_pin:
-                    logger.log_audit("DANGEROUS_DETECTED", user_input, str(action_data), False)
+            pins = [self._check_action(user_input, action) for action in actions]
             
-            return {
-                "response": natural_response,
-                "action": action_data,
-                "needs_pin": needs_pin
-            }
+            if local["cacheable"] and not any(pins):
+                # Pure conversation depends on what was just said; actions don't
+                response_cache.put(local["cache_key"] if actions else local["chat_key"], natural_response, actions)
             
+            return self._finish(record, request_started, "model", self._result(natural_response, actions, pins))
+        
+        except LLMUnavailableError as e:
+            return self._finish(record, request_started, "fallback", self._fallback(user_input, e))
+        
         except Exception as e:
             logger.log_error("BRAIN_PROCESS", str(e), user_input)
-            return {
-                "response": f"Sorry, I encountered an error: {str(e)}",
-                "action": None,
-                "needs_pin": False
-            }
-    
-    def _extract_json(self, text):
-        """Extract JSON from response text"""
+            return self._finish(record, request_started, "error",
+                                self._result(f"Sorry, I encountered an error: {str(e)}"))
+    
+    def process_batch(self, inputs, max_workers=None):
+        """Interpret several commands at once, with at most max_workers in flight
+
+        Every input is answered against one context snapshot taken up front, so the
+        answers don't depend on which call finished first. Returns {"results" (one
+        process() dict per input, in input order), "plan" (all actions in input order,
+        depends_on shifted to plan indexes, ready for AutomationEngine.execute_plan),
+        "plan_pins", "seconds", "commands_per_second"}.
+        """
+        inputs = [text.strip() for text in inputs if text and text.strip()]
+        started = time.perf_counter()
+        results = []
+        if inputs:
+            snapshot = self._context_snapshot(inputs)
+            workers = max(1, min(max_workers or config.batch_max_workers, len(inputs)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="anna-batch") as pool:
+                results = list(pool.map(lambda text: self.process(text, snapshot), inputs))
+        
+        plan = []
+        pins = []
+        for result in results:
+            offset = len(plan)
+            for index, (action_data, needs_pin) in enumerate(zip(result["actions"], result["action_pins"])):
+                step = dict(action_data)
+                if "depends_on" in step:
+                    step["depends_on"] = [dep + offset for dep in normalize_deps(step, index)]
+                plan.append(step)
+                pins.append(needs_pin)
+        
+        seconds = time.perf_counter() - started
+        rate = len(inputs) / seconds if inputs and seconds > 0 else 0.0
+        logger.log_debug(f"Batch: {len(inputs)} commands, {len(plan)} steps in {seconds:.2f}s ({rate:.1f}/s)")
+        return {
+            "results": results,
+            "plan": plan,
+            "plan_pins": pins,
+            "seconds": seconds,
+            "commands_per_second": rate,
+        }
+    
+    def _context_snapshot(self, inputs):
+        """Context packed once for a whole batch, leaving room for its longest input"""
+        longest = max(estimate_tokens(f"User: {text}") for text in inputs)
+        fixed_tokens = estimate_tokens(self._instructions()) + longest + 8
+        return prompt_assembler.pack(
+            memory.build_context_sections(" ".join(inputs)),
+            config.prompt_token_budget - fixed_tokens
+        )
+    
+    def process_stream(self, user_input, on_text=None, on_action=None, should_stop=None):
+        """Like process(), but streams the reply
+
+        on_text(piece) gets prose as it arrives; on_action(action_data, needs_pin) fires
+        for each action as soon as its JSON is complete, before the rest of the reply.
+        should_stop() is polled between chunks; once it returns True the stream is
+        abandoned and the result is marked "cancelled".
+        Returns the same dict as process().
+        """
+        request_started = time.perf_counter()
+        record = {"stream": True}
         try:
-            # Look for JSON between curly braces
-            start = text.find('{')
-            end = text.rfind('}') + 1
+            local = self._answer_locally(user_input)
+            if local["result"]:
+                result = local["result"]
+                if on_action:
+                    for action_data, needs_pin in zip(result["actions"], result["action_pins"]):
+                        on_action(action_data, needs_pin)
+                if on_text and result["response"]:
+                    on_text(result["response"])
+                return self._finish(record, request_started, local["outcome"], result)
             
-            if start >= 0 and end > start:
-                json_str = text[start:end]
-                return json.loads(json_str)
+            build_started = time.perf_counter()
+            instructions, turn_prompt, single_prompt_tokens = self._prepare_request(user_input)
+            record["prompt_build_ms"] = elapsed_ms(build_started)
+            route = model_router.route(user_input)
+            record.update(tier=route["tier"], model=route["model"], parse_ms=0.0)
             
-            return None
-        except:
-            return None
-    
-    def _extract_natural_response(self, text):
-        """Extract natural language response (text after JSON)"""
-        # Remove JSON if present
-        start = text.find('{')
-        end = text.rfind('}') + 1
-        
-        if start >= 0 and end > start:
-            # Get text after JSON
-            after_json = text[end:].strip()
-            if after_json:
-                return after_json
-            # Get text before JSON
-            before_json = text[:start].strip()
-            if before_json:
-                return before_json
-        
-        # No JSON found, return full text
-        return text
+            parser = StreamingActionParser()
+            pieces = []
+            actions = []
+            pins = []
+            timings = {}
+            started = time.perf_counter()
+            
+            def handle(events):
+                for kind, value in events:
+                    if should_stop and should_stop():
+                        return
+                    if kind == "action":
+                        if value.get("action") == "none":
+                            continue
+                        needs_pin = self._check_action(user_input, value)
+                        actions.append(value)
+                        pins.append(needs_pin)
+                        timings.setdefault("first_action", time.perf_counter() - started)
+                        if on_action:
+                            on_action(value, needs_pin)
+                    else:
+                        if value.strip() and not value.strip(" \t\r\n[],"):
+                            # Brackets/commas of an action array
+                            continue
+                        if not pieces:
+                            # Leading whitespace before the first word is not worth showing
+                            value = value.lstrip()
+                            if not value:
+                                continue
+                            timings.setdefault("first_word", time.perf_counter() - started)
+                        pieces.append(value)
+                        if on_text:
+                            on_text(value)
+            
+            cancelled = False
+            usage = None
+            try:
+                for chunk in self.llm.generate(turn_prompt, system_instruction=instructions,
+                                               stream=True, model=route["model"]):
+                    if should_stop and should_stop():
+                        # Superseded: stop reading, run nothing more
+                        cancelled = True
+                        break
+                    record.setdefault("first_chunk_ms", elapsed_ms(started))
+                    # Token counts arrive with the final chunk
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata) carry nothing to show
+                        continue
+                    parse_started = time.perf_counter()
+                    events = parser.feed(text)
+                    record["parse_ms"] += (time.perf_counter() - parse_started) * 1000
+                    handle(events)
+            except LLMUnavailableError as e:
+                if not pieces and not actions:
+                    result = self._fallback(user_input, e)
+                    if on_action:
+                        for action_data, needs_pin in zip(result["actions"], result["action_pins"]):
+                            on_action(action_data, needs_pin)
+                    if on_text:
+                        on_text(result["response"])
+                    return self._finish(record, request_started, "fallback", result)
+                # Part of the reply already went out: keep it, but don't cache it
+                handle(parser.close())
+                note = " (The rest of my reply was cut off.)"
+                if on_text:
+                    on_text(note)
+                return self._finish(record, request_started, "partial",
+                                    self._result("".join(pieces).strip() + note, actions, pins))
+            if not cancelled:
+                handle(parser.close())
+            
+            elapsed = time.perf_counter() - started
+            record["model_ms"] = round(elapsed * 1000, 1)
+            intent_parser.record_model_latency(elapsed)
+            if not cancelled:
+                model_router.record(route, elapsed)
+                self._record_usage(usage, single_prompt_tokens, record)
+            logger.log_debug(
+                f"Stream timings: first word {timings.get('first_word', elapsed):.2f}s, "
+                f"first action {timings.get('first_action', elapsed):.2f}s, total {elapsed:.2f}s"
+            )
+            
+            natural_response = "".join(pieces).strip()
+            if cancelled:
+                logger.log_debug(f"Stream cancelled after {elapsed:.2f}s: {user_input[:50]}")
+                result = self._result(natural_response, actions, pins)
+                result["cancelled"] = True
+                return self._finish(record, request_started, "cancelled", result)
+            if local["cacheable"] and not any(pins):
+                # Pure conversation depends on what was just said; actions don't
+                response_cache.put(local["cache_key"] if actions else local["chat_key"], natural_response, actions)
+            
+            return self._finish(record, request_started, "model", self._result(natural_response, actions, pins))
+        
+        except Exception as e:
+            logger.log_error("BRAIN_PROCESS_STREAM", str(e), user_input)
+            message = f"Sorry, I encountered an error: {str(e)}"
+            if on_text:
+                on_text(message)
+            return self._finish(record, request_started, "error", self._result(message))
+    
+    def _finish(self, record, started, outcome, result):
+        """Complete and store the metrics record of a request; returns result unchanged"""
+        record.update(outcome=outcome, total_ms=elapsed_ms(started), actions=len(result["actions"]))
+        if "parse_ms" in record:
+            record["parse_ms"] = round(record["parse_ms"], 3)
+        request_metrics.record(record)
+        return result
+    
+    def _result(self, response, actions=None, pins=None):
+        """Result dict returned by process() and process_stream()
+
+        "action" (the first action) and "needs_pin" (any action) are kept for callers
+        that handle a single action; "actions"/"action_pins" list every step in order.
+        """
+        actions = actions or []
+        pins = pins or [False] * len(actions)
+        return {
+            "response": response,
+            "action": actions[0] if actions else None,
+            "actions": actions,
+            "action_pins": pins,
+            "needs_pin": any(pins)
+        }
+    
+    def _answer_locally(self, user_input):
+        """Fast path, missing model and cache lookups shared by process() and process_stream()
+
+        Returns {"result", "outcome", "cacheable", "cache_key", "chat_key"}; result is None
+        when the model is needed, otherwise outcome says where it came from (for request
+        metrics). Replies with actions are cached under cache_key; conversational replies
+        under chat_key, which also covers the last few exchanges.
+        """
+        local = {"result": None, "outcome": None, "cacheable": False, "cache_key": None, "chat_key": None}
+        
+        # Common commands are matched locally, no model round trip
+        fast = intent_parser.parse(user_input)
+        if fast:
+            action_data = fast["action"]
+            logger.log_debug(f"Fast path: {action_data}")
+            local["outcome"] = "fast_path"
+            local["result"] = self._result(fast["response"], [action_data],
+                                           [self._check_action(user_input, action_data)])
+            return local
+        
+        # Check if model is configured
+        if not self.llm.available:
+            local["outcome"] = "not_configured"
+            local["result"] = self._result(
+                "I'm not properly configured. Please set your GEMINI_API_KEY in the .env file."
+            )
+            return local
+        
+        # Identical requests under the same context reuse the earlier reply;
+        # anything that looks dangerous always goes to the model and the PIN check
+        local["cacheable"] = not safety.is_dangerous(user_input)
+        normalized = intent_parser.normalize(user_input)
+        fingerprint = self._context_fingerprint()
+        local["cache_key"] = response_cache.make_key(normalized, fingerprint)
+        local["chat_key"] = response_cache.make_key(normalized, fingerprint + self._conversation_fingerprint())
+        cached = None
+        if local["cacheable"]:
+            cached = response_cache.get(local["cache_key"])
+            if cached and not cached["actions"]:
+                cached = None  # Conversation cached before chat_key existed
+            cached = cached or response_cache.get(local["chat_key"])
+        if cached:
+            logger.log_debug(f"Response cache hit: {cached['actions']}")
+            local["outcome"] = "cache"
+            local["result"] = self._result(cached["response"], cached["actions"],
+                                           [self._check_action(user_input, action) for action in cached["actions"]])
+        return local
+    
+    def _fallback(self, user_input, error):
+        """Local answer when the model can't be reached in time
+
+        Compound commands ("volume up and open chrome") still work when every part
+        matches the fast path on its own; anything else gets an apology.
+        """
+        logger.log_debug(f"Model unavailable ({error}), answering locally: {user_input[:50]}")
+        parts = [part for part in re.split(r"\s+(?:and then|and|then)\s+", intent_parser.normalize(user_input or "")) if part]
+        if len(parts) > 1:
+            matches = [intent_parser.parse(part) for part in parts]
+            if all(matches):
+                actions = [match["action"] for match in matches]
+                return self._result(" ".join(match["response"] for match in matches), actions,
+                                    [self._check_action(user_input, action) for action in actions])
+        return self._result(
+            "I can't reach the AI service right now, so I can only handle simple commands "
+            "like \"open chrome\" or \"volume up\". Please try again in a moment."
+        )
+    
+    def _check_action(self, user_input, action_data):
+        """Whether an action needs PIN confirmation (audited when it does)"""
+        if not action_data or action_data.get("action") == "none":
+            return False
+        needs_pin = safety.requires_pin(user_input, action_data.get("action"))
+        if needs_pin:
+            logger.log_audit("DANGEROUS_DETECTED", user_input, str(action_data), False)
+        return needs_pin
     
     def generate_simple_response(self, user_input):
         """Generate a simple conversational response without actions"""
         try:
-            if not self.model:
+            if not self.llm.available:
                 return "I'm not properly configured. Please set your GEMINI_API_KEY."
             
             prompt = f"""You are Anna, a helpful AI assistant. Respond naturally and conversationally.
 
 Context:
-{memory.build_context_string()}
+{memory.build_context_string(user_input)}
 
 User: {user_input}
 Anna:"""
             
-            response = self.model.generate_content(prompt)
+            response = self.llm.generate(prompt, model=model_router.route(user_input)["model"])
             return response.text.strip()
-            
+        
+        except LLMUnavailableError:
+            return "I can't reach the AI service right now. Please try again in a moment."
+        
         except Exception as e:
             logger.log_error("SIMPLE_RESPONSE", str(e), user_input)
             return f"Sorry, I encountered an error: {str(e)}"
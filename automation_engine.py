@@ -4,7 +4,10 @@ Main dispatcher that routes JSON action commands to appropriate handlers
 """
 
 import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import config
 from logger import logger
+from action_parser import normalize_deps
 from app_launcher import app_launcher
 from file_operations import file_ops
 from web_handler import web_handler
@@ -12,10 +15,17 @@ from system_control import system_control
 from input_automation import input_automation
 
 
+# Actions that act on whatever window has focus: they wait for every earlier step,
+# and every later step waits for them
+FOCUS_ACTIONS = {"type_text", "press_key", "click", "move_mouse"}
+FINISHED_UNSUCCESSFULLY = ("failed", "skipped", "blocked")
+
+
 class AutomationEngine:
     """Main automation dispatcher"""
     
-    def __init__(self):
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
         self.handlers = {
             "open_app": self._handle_open_app,
             "open_file": self._handle_open_file,
@@ -52,7 +62,7 @@ class AutomationEngine:
             result = handler(action_data)
             
             return result
-            
+        
         except json.JSONDecodeError as e:
             logger.log_error("JSON_PARSE", str(e), str(action_data))
             return {"success": False, "message": "Invalid action format"}
@@ -60,6 +70,90 @@ class AutomationEngine:
             logger.log_error("EXECUTE_ACTION", str(e), str(action_data))
             return {"success": False, "message": f"Error executing action: {str(e)}"}
     
+    def execute_plan(self, plan, approve=None, completed=None):
+        """Execute an ordered list of actions, running independent steps concurrently
+
+        A step may name the steps it needs with "depends_on" (indexes into the plan) and
+        is blocked if one of them fails; focus-dependent input actions are only ordered
+        after their neighbours, whatever the outcome. approve(index, step) is
+        asked once per step before anything runs; a refused step is skipped along with
+        everything that depends on it. completed maps indexes of steps that already ran
+        (e.g. dispatched while a reply was still streaming) to their results.
+        Returns {"success", "message", "steps": [{"index", "action", "status", "success", "message"}]}.
+        """
+        steps = [step if isinstance(step, dict) else json.loads(step) for step in plan]
+        required, after = self._plan_dependencies(steps)
+        results = [
+            {"index": i, "action": step.get("action", "none"), "status": "pending",
+             "success": False, "message": ""}
+            for i, step in enumerate(steps)
+        ]
+        for i, result in (completed or {}).items():
+            result = result or {}
+            results[i].update(
+                status="done" if result.get("success") else "failed",
+                success=bool(result.get("success")),
+                message=result.get("message", "")
+            )
+        
+        # Safety gating happens up front, in the caller's thread (it may prompt for a PIN)
+        for i, step in enumerate(steps):
+            if results[i]["status"] != "pending":
+                continue
+            if approve and not approve(i, step):
+                results[i].update(status="skipped", message="Not approved")
+        
+        running = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(steps), 1)),
+                                thread_name_prefix="anna-plan") as pool:
+            while True:
+                for i, step in enumerate(steps):
+                    if results[i]["status"] != "pending":
+                        continue
+                    failed = [d for d in required[i] if results[d]["status"] in FINISHED_UNSUCCESSFULLY]
+                    if failed:
+                        results[i].update(status="blocked", message=f"Needs failed step(s) {failed}")
+                    elif all(results[d]["status"] not in ("pending", "running") for d in after[i]):
+                        results[i]["status"] = "running"
+                        running[pool.submit(self.execute, step)] = i
+                
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    result = future.result() or {}
+                    results[i].update(
+                        status="done" if result.get("success") else "failed",
+                        success=bool(result.get("success")),
+                        message=result.get("message", "")
+                    )
+        
+        succeeded = sum(1 for result in results if result["success"])
+        logger.log_action("execute_plan", f"{succeeded}/{len(steps)} steps", succeeded == len(steps))
+        return {
+            "success": succeeded == len(steps),
+            "message": f"{succeeded} of {len(steps)} steps completed",
+            "steps": results
+        }
+    
+    def _plan_dependencies(self, steps):
+        """Per step: (steps that must succeed first, steps that must merely finish first)"""
+        required = []
+        after = []
+        last_focus = None
+        for i, step in enumerate(steps):
+            needs = set(normalize_deps(step, i))
+            waits = set(needs)
+            if step.get("action") in FOCUS_ACTIONS:
+                waits.update(range(i))
+                last_focus = i
+            elif last_focus is not None:
+                waits.add(last_focus)
+            required.append(sorted(needs))
+            after.append(sorted(waits))
+        return required, after
+    
     # Action Handlers
     
     def _handle_open_app(self, data):
@@ -180,4 +274,4 @@ class AutomationEngine:
 
 
 # Global automation engine instance
-automation_engine = AutomationEngine()
+automation_engine = AutomationEngine(config.plan_max_workers)
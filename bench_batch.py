@@ -0,0 +1,75 @@
+"""Benchmark: AnnaBrain.process_batch vs serial process() calls against the local stand-in model"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--commands', type=int, default=16)
+parser.add_argument('--workers', type=int, default=4)
+parser.add_argument('--latency', type=float, default=0.4, help="Stand-in seconds before the first chunk")
+parser.add_argument('--port', type=int, default=8799)
+options = parser.parse_args()
+
+# Run in a scratch directory so config/, logs/ and the reply cache are throwaway
+os.chdir(tempfile.mkdtemp(prefix="anna_bench_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Point the brain at an in-process stand-in server before anything reads the config
+os.environ["LLM_BACKEND"] = "http"
+os.environ["LLM_SERVER_URL"] = f"http://127.0.0.1:{options.port}"
+os.environ["REQUEST_METRICS"] = "false"
+
+from http.server import ThreadingHTTPServer
+from llm_server import StandInHandler
+from anna_brain import anna_brain
+from response_cache import response_cache
+
+ROUTINE = [
+    "what's the weather like for a morning run",
+    "remind me what's on my plate today",
+    "give me a motivational quote",
+    "what should I cook for breakfast",
+    "summarize the news headlines style for today",
+    "how long is a good stretching routine",
+    "suggest a playlist mood for focus",
+    "what's a good first task for the day",
+]
+
+
+def commands(n, tag):
+    """n distinct commands, none matching the local fast path"""
+    return [f"{ROUTINE[i % len(ROUTINE)]} ({tag} {i})" for i in range(n)]
+
+
+def start_server():
+    StandInHandler.options = argparse.Namespace(latency=options.latency, per_chunk=0.0,
+                                                chunk_chars=24, jitter=0.0, quiet=True)
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_server()
+    response_cache.clear()
+    
+    serial_inputs = commands(options.commands, "serial")
+    start = time.perf_counter()
+    serial = [anna_brain.process(text) for text in serial_inputs]
+    serial_seconds = time.perf_counter() - start
+    
+    batch = anna_brain.process_batch(commands(options.commands, "batch"), options.workers)
+    server.shutdown()
+    
+    ok = len(batch["results"]) == len(serial) == options.commands
+    ok = ok and all(f"(batch {i})" in result["response"] for i, result in enumerate(batch["results"]))
+    print(f"{options.commands} commands, stand-in latency {options.latency}s, {options.workers} workers")
+    print(f"serial process()  {serial_seconds:6.2f}s  {options.commands / serial_seconds:6.2f} commands/s")
+    print(f"process_batch()   {batch['seconds']:6.2f}s  {batch['commands_per_second']:6.2f} commands/s "
+          f"({serial_seconds / batch['seconds']:.1f}x)")
+    if not ok:
+        print("FAIL: batch results missing or out of order")
+        sys.exit(1)
+    print("OK: results in input order")
@@ -0,0 +1,51 @@
+"""Check: conversation memory stays flat over 100k turns (tracemalloc)"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+TURNS = 100000
+WARMUP = 10000
+MAX_GROWTH_KB = 256
+
+# Run in a scratch directory so config/, logs/ and the history journal are throwaway
+os.chdir(tempfile.mkdtemp(prefix="anna_bench_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# The session summarizer folds turns through the model: answer offline, never Gemini
+os.environ["LLM_BACKEND"] = "replay"
+
+from memory import memory  # noqa: E402
+from context_cache import context_cache  # noqa: E402
+
+
+def run_turns(start, end):
+    for i in range(start, end):
+        memory.add_exchange(
+            f"open chrome and search for item {i}",
+            f"Opening Chrome and searching for item {i}.",
+            {"action": "web_search", "query": f"item {i}", "engine": "google", "extra": "x" * 200}
+        )
+        memory.build_context_string()
+
+
+if __name__ == "__main__":
+    tracemalloc.start()
+    
+    run_turns(0, WARMUP)
+    baseline, _ = tracemalloc.get_traced_memory()
+    
+    run_turns(WARMUP, TURNS)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    growth_kb = (current - baseline) / 1024
+    print(f"turns: {TURNS} | buffered: {len(memory.current_conversation)} | "
+          f"evicted: {memory.current_conversation.evicted}")
+    print(f"traced after {WARMUP} turns: {baseline / 1024:.0f} KB | after {TURNS} turns: "
+          f"{current / 1024:.0f} KB | growth: {growth_kb:.0f} KB | peak: {peak / 1024:.0f} KB")
+    print(f"context cache: {context_cache.stats()['total']}")
+    
+    if growth_kb > MAX_GROWTH_KB:
+        print(f"FAIL: memory grew by more than {MAX_GROWTH_KB} KB")
+        sys.exit(1)
+    print("OK: memory stays flat")
@@ -0,0 +1,143 @@
+"""Fuzz check + benchmark: parse_reply vs the old first-'{'-to-last-'}' extraction"""
+import json
+import random
+import sys
+import time
+from action_parser import StreamingActionParser, parse_reply
+
+random.seed(7)
+CASES = 2000
+ROUNDS = 20
+
+ACTIONS = [
+    {"action": "open_app", "target": "chrome"},
+    {"action": "web_search", "query": "python {f-strings}", "engine": "google"},
+    {"action": "type_text", "text": "He said \"hi\" and left }"},
+    {"action": "press_key", "key": "ctrl+c"},
+    {"action": "open_url", "url": "https://example.com/?q={x}"},
+    {"action": "system_control", "target": "brightness", "level": 40},
+    {"action": "write_file", "target": "C:\\notes\\todo.txt", "content": "a\nb {c}"},
+    {"action": "open_folder", "target": "C:\\Users\\me\\Downloads"},
+]
+PROSE = [
+    "Sure, opening that for you.",
+    "Here's what I'll do:",
+    "Use {name} as a placeholder in the template.",
+    "Done! Anything else?",
+    "A set looks like {1, 2, 3} in Python.",
+    "",
+    "Let me know if that works.",
+    # Unbalanced braces in prose must not swallow the actions after them
+    "Use { to start a block.",
+    "Type {{ twice, then press enter.",
+    "A stray {\"key\" that never closes.",
+    "Close it with }.",
+]
+
+
+def legacy_extract_json(text):
+    """The previous AnnaBrain._extract_json"""
+    try:
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start >= 0 and end > start:
+            return json.loads(text[start:end])
+        return None
+    except Exception:
+        return None
+
+
+def legacy_extract_natural_response(text):
+    """The previous AnnaBrain._extract_natural_response"""
+    start = text.find('{')
+    end = text.rfind('}') + 1
+    if start >= 0 and end > start:
+        after_json = text[end:].strip()
+        if after_json:
+            return after_json
+        before_json = text[:start].strip()
+        if before_json:
+            return before_json
+    return text
+
+
+def render_action(action):
+    """One action as a model might write it: compact, indented or fenced"""
+    style = random.randrange(3)
+    if style == 0:
+        return json.dumps(action)
+    if style == 1:
+        return json.dumps(action, indent=2)
+    return "```json\n" + json.dumps(action, indent=2) + "\n```"
+
+
+def make_case():
+    """A reply with 0-3 actions and prose around them, plus the expected actions"""
+    actions = random.sample(ACTIONS, random.randint(0, 3))
+    parts = [random.choice(PROSE)]
+    if len(actions) > 1 and random.random() < 0.3:
+        parts.append("[" + ",\n".join(json.dumps(a) for a in actions) + "]")
+    else:
+        for action in actions:
+            parts.append(render_action(action))
+            parts.append(random.choice(PROSE))
+    return "\n".join(part for part in parts if part), actions
+
+
+def split_randomly(text):
+    """Cut text into stream-like chunks of 1-40 characters"""
+    chunks, i = [], 0
+    while i < len(text):
+        size = random.randint(1, 40)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+def streamed_actions(chunks):
+    parser = StreamingActionParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return [value for kind, value in events if kind == "action"]
+
+
+def check(corpus):
+    """Count replies whose actions came out exactly right"""
+    legacy_ok = parse_ok = stream_ok = 0
+    for text, expected in corpus:
+        legacy = legacy_extract_json(text)
+        legacy_ok += (legacy == expected[0]) if len(expected) == 1 else (legacy is None and not expected)
+        actions, _ = parse_reply(text)
+        parse_ok += actions == expected
+        stream_ok += streamed_actions(split_randomly(text)) == expected
+    return legacy_ok, parse_ok, stream_ok
+
+
+def throughput(corpus, extract):
+    total_bytes = sum(len(text) for text, _ in corpus) * ROUNDS
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text, _ in corpus:
+            extract(text)
+    elapsed = time.perf_counter() - start
+    return total_bytes / elapsed / 1e6, elapsed * 1e6 / (len(corpus) * ROUNDS)
+
+
+if __name__ == "__main__":
+    corpus = [make_case() for _ in range(CASES)]
+    legacy_ok, parse_ok, stream_ok = check(corpus)
+    print(f"fuzz corpus: {CASES} replies | correct actions: legacy {legacy_ok / CASES:.1%} | "
+          f"parse_reply {parse_ok / CASES:.1%} | streamed in random chunks {stream_ok / CASES:.1%}")
+    
+    legacy_mb, legacy_us = throughput(
+        corpus, lambda t: (legacy_extract_json(t), legacy_extract_natural_response(t)))
+    parse_mb, parse_us = throughput(corpus, parse_reply)
+    print(f"legacy extract {legacy_mb:6.2f} MB/s ({legacy_us:6.1f} us/reply) | "
+          f"parse_reply {parse_mb:6.2f} MB/s ({parse_us:6.1f} us/reply)")
+    
+    if parse_ok != CASES or stream_ok != CASES:
+        print("FAIL: parser missed actions in the fuzz corpus")
+        sys.exit(1)
+    print("OK: every action recovered")
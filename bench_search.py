@@ -0,0 +1,65 @@
+"""Benchmark: BM25 search index vs the old linear scan in Memory.search_documents"""
+import random
+import tempfile
+import time
+from pathlib import Path
+from search_index import SearchIndex
+
+random.seed(42)
+VOCABULARY = [f"word{i}" for i in range(20000)]
+QUERIES = ["word17", "word4242 word99", "word19999", "word5 word6 word7", "missingterm"]
+WORDS_PER_DOC = 300
+
+
+def make_documents(count):
+    """Synthetic documents with a Zipf-like word distribution"""
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    docs = {}
+    for i in range(count):
+        words = random.choices(VOCABULARY, weights=weights, k=WORDS_PER_DOC)
+        docs[f"doc{i}.txt"] = {"content": " ".join(words), "summary": " ".join(words[:20])}
+    return docs
+
+
+def linear_scan(docs, query):
+    """The previous implementation: lowercase every body on every query"""
+    results = []
+    for name, doc in docs.items():
+        content = doc.get("content", "")
+        summary = doc.get("summary", "")
+        if query.lower() in content.lower() or query.lower() in summary.lower():
+            results.append({"filename": name, "summary": summary})
+    return results
+
+
+def bench(count):
+    docs = make_documents(count)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(Path(tmp) / "bench_index.db")
+        
+        start = time.perf_counter()
+        for name, doc in docs.items():
+            index.add(name, doc["content"], doc["summary"])
+        build_s = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for query in QUERIES:
+            linear_scan(docs, query)
+        scan_ms = (time.perf_counter() - start) * 1000 / len(QUERIES)
+        
+        start = time.perf_counter()
+        for query in QUERIES:
+            index.search(query, limit=10)
+        index_ms = (time.perf_counter() - start) * 1000 / len(QUERIES)
+        
+        index.close()
+    
+    print(f"{count:>6} docs | index build {build_s:6.2f}s | "
+          f"linear scan {scan_ms:8.2f} ms/query | BM25 index {index_ms:8.2f} ms/query | "
+          f"speedup {scan_ms / index_ms:6.1f}x")
+
+
+if __name__ == "__main__":
+    for count in (1000, 10000):
+        bench(count)
@@ -0,0 +1,73 @@
+"""
+Anna AI Assistant - Blob Store
+Content-addressed, compressed storage for learned document bodies
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+
+
+class BlobStore:
+    """Stores document bodies as zlib-compressed files keyed by hash"""
+    
+    KEY_PATTERN = re.compile(r'^[0-9a-f]{16,128}$')
+    
+    def __init__(self, root, compression_level=6):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compression_level = compression_level
+    
+    @staticmethod
+    def content_key(text):
+        """Hash used when a document has no file hash"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _path(self, key):
+        """Blob path, fanned out by key prefix"""
+        if not self.KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return self.root / key[:2] / f"{key}.z"
+    
+    def exists(self, key):
+        """Check if a blob is stored"""
+        return self._path(key).exists()
+    
+    def put(self, key, text):
+        """Store text under key (no-op if the blob already exists)"""
+        path = self._path(key)
+        if path.exists():
+            return key
+        
+        path.parent.mkdir(exist_ok=True)
+        data = zlib.compress(text.encode('utf-8'), self.compression_level)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+    
+    def get(self, key):
+        """Read and decompress a blob, or None if missing"""
+        path = self._path(key)
+        if not path.exists():
+            return None
+        
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return zlib.decompress(mm).decode('utf-8')
+    
+    def delete(self, key):
+        """Remove a blob"""
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
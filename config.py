@@ -3,11 +3,19 @@ Anna AI Assistant - Configuration Management
 Handles user settings, PIN storage, app paths, and preferences
 """
 
-import json
+import atexit
 import hashlib
+import json
 import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from storage import open_storage, SCALAR_SETTINGS
+from blob_store import BlobStore
+from journal import ConversationJournal
+from logger import logger
 
 
 class Config:
@@ -20,6 +28,10 @@ class Config:
         self.config_dir.mkdir(exist_ok=True)
         
         self.config_file = self.config_dir / "anna_config.json"
+        
+        # Storage backend: "sqlite" (row-level writes) or "json" (legacy single file)
+        self.storage_backend = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+        self.storage = open_storage(self.storage_backend, self.config_dir)
         self.settings = self._load_config()
         
         # Environment variables
@@ -28,13 +40,74 @@ class Config:
         self.enable_debug = os.getenv("ENABLE_DEBUG_MODE", "false").lower() == "true"
         self.enable_logging = os.getenv("ENABLE_ACTION_LOGGING", "true").lower() == "true"
         self.default_personality = os.getenv("DEFAULT_PERSONALITY", "adaptive")
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+        self.conversation_buffer_size = int(os.getenv("CONVERSATION_BUFFER_SIZE", "200"))
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+        self.plan_max_workers = int(os.getenv("PLAN_MAX_WORKERS", "4"))
+        self.batch_max_workers = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+        self.request_queue_size = int(os.getenv("REQUEST_QUEUE_SIZE", "8"))
+        self.prompt_cache = os.getenv("PROMPT_CACHE", "true").lower() == "true"
+        self.prompt_cache_ttl = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+        self.llm_backend = os.getenv("LLM_BACKEND", "gemini").lower()
+        self.gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        self.model_routing = os.getenv("MODEL_ROUTING", "true").lower() == "true"
+        self.model_fast = os.getenv("MODEL_FAST", "gemini-2.5-flash-lite")
+        self.model_full = os.getenv("MODEL_FULL", self.gemini_model)
+        self.request_metrics = os.getenv("REQUEST_METRICS", "true").lower() == "true"
+        self.llm_server_url = os.getenv("LLM_SERVER_URL", "http://127.0.0.1:8765")
+        self.llm_replay_file = os.getenv("LLM_REPLAY_FILE", str(self.config_dir / "llm_replay.jsonl"))
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", "15"))
+        self.llm_deadline = float(os.getenv("LLM_DEADLINE", "30"))
+        self.llm_retries = int(os.getenv("LLM_RETRIES", "2"))
+        self.llm_breaker_failures = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+        self.llm_breaker_cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        
+        # Write-behind: coalesce bursts of changes into one background flush
+        self.write_behind = os.getenv("CONFIG_WRITE_BEHIND", "true").lower() == "true"
+        self.flush_delay = float(os.getenv("CONFIG_FLUSH_DELAY", "0.5"))
+        self._lock = threading.RLock()
+        self._pending = []
+        self._dirty = threading.Event()
+        self._stop_flusher = threading.Event()
+        self._flusher = None
+        self.write_stats = {"requested": 0, "flushed": 0, "rows_written": 0}
+        
+        if self.write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+        
+        # Lookup tables for recognizing documents that were already learned
+        self._docs_by_hash = {}
+        self._docs_by_path = {}
+        
+        # Document bodies and chunk lists live in the blob store; config keeps metadata only
+        self.blobs = BlobStore(self.config_dir / "blobs")
+        self._chunk_cache = OrderedDict()  # chunks_key -> chunk list, most recent last
+        self._migrate_document_bodies()
+        for name, doc_meta in self.settings["learned_documents"].items():
+            self._index_document(name, doc_meta)
+        
+        # Conversation history: append-only journal bounded by disk usage
+        self.journal = ConversationJournal(
+            self.config_dir / "history",
+            max_segment_bytes=int(os.getenv("HISTORY_SEGMENT_KB", "1024")) * 1024,
+            max_total_bytes=int(os.getenv("HISTORY_MAX_MB", "64")) * 1024 * 1024
+        )
+        self._migrate_history()
     
     def _load_config(self):
-        """Load configuration from file"""
-        if self.config_file.exists():
-            with open(self.config_file, 'r') as f:
-                return json.load(f)
-        return self._default_config()
+        """Load configuration from storage"""
+        settings = self.storage.load()
+        if settings is not None:
+            return settings
+        
+        settings = self._default_config()
+        if self.storage_backend != "json":
+            # Seed the database so defaults are stored as rows from the start
+            self.storage.import_settings(settings)
+        return settings
     
     def _default_config(self):
         """Return default configuration"""
@@ -66,9 +139,84 @@ class Config:
         }
     
     def save_config(self):
-        """Save configuration to file"""
-        with open(self.config_file, 'w') as f:
-            json.dump(self.settings, f, indent=2)
+        """Save top-level settings (PIN, first run flag, preferences)"""
+        with self._lock:
+            for key in SCALAR_SETTINGS:
+                if key in self.settings:
+                    self._persist("settings", key, self.settings[key])
+    
+    def _persist(self, table, key, value):
+        """Queue a changed row and flush it now or in the background"""
+        with self._lock:
+            self._pending.append((table, key, value))
+            self.write_stats["requested"] += 1
+        
+        if self.write_behind:
+            self._dirty.set()
+        else:
+            self.flush()
+    
+    def _flush_loop(self):
+        """Background writer: wait for changes, let the burst settle, flush once
+
+        A failed write stays pending and is retried after a doubling delay (1s up to 60s).
+        """
+        retry_delay = 1.0
+        while True:
+            self._dirty.wait()
+            if self._stop_flusher.wait(self.flush_delay):
+                return
+            self._dirty.clear()
+            if self.flush():
+                retry_delay = 1.0
+                continue
+            
+            self._dirty.set()
+            if self._stop_flusher.wait(retry_delay):
+                return
+            retry_delay = min(retry_delay * 2, 60.0)
+    
+    def flush(self):
+        """Write all pending changes to storage; False if the write failed"""
+        with self._lock:
+            if not self._pending:
+                return True
+            
+            # Coalesce: only the last value per row matters (history rows are appends)
+            changes = {}
+            for index, (table, key, value) in enumerate(self._pending):
+                row_id = (table, index) if table == "history" else (table, key)
+                changes.pop(row_id, None)
+                changes[row_id] = (table, key, value)
+            
+            try:
+                self.storage.write(self.settings, list(changes.values()))
+                self.write_stats["flushed"] += 1
+                self.write_stats["rows_written"] += len(changes)
+                self._pending = []
+                return True
+            except Exception as e:
+                logger.log_error("CONFIG_FLUSH", str(e), f"{len(self._pending)} pending changes")
+                return False
+    
+    def get_write_stats(self):
+        """Get write-behind counters (how many storage writes were saved)"""
+        with self._lock:
+            stats = dict(self.write_stats)
+        stats["saved"] = stats["requested"] - stats["flushed"]
+        stats["pending"] = len(self._pending)
+        return stats
+    
+    def close(self):
+        """Stop the background writer, flush pending changes and release storage (called on shutdown)"""
+        self._stop_flusher.set()
+        self._dirty.set()
+        if self._flusher:
+            # A flush already under way finishes before storage is closed
+            self._flusher.join(timeout=5)
+        self.flush()
+        self.storage.close()
+        self.journal.close()
     
     def hash_pin(self, pin):
         """Hash PIN using SHA-256"""
@@ -76,9 +224,10 @@ class Config:
     
     def set_pin(self, pin):
         """Set user PIN (hashed)"""
-        self.settings["pin_hash"] = self.hash_pin(pin)
-        self.settings["first_run"] = False
-        self.save_config()
+        with self._lock:
+            self.settings["pin_hash"] = self.hash_pin(pin)
+            self.settings["first_run"] = False
+            self.save_config()
     
     def verify_pin(self, pin):
         """Verify PIN against stored hash"""
@@ -92,13 +241,15 @@ class Config:
     
     def learn_app(self, name, path):
         """Learn new application path"""
-        self.settings["learned_apps"][name.lower()] = path
-        self.save_config()
+        with self._lock:
+            self.settings["learned_apps"][name.lower()] = path
+            self._persist("apps", name.lower(), path)
     
     def learn_game(self, name, path):
         """Learn new game path"""
-        self.settings["learned_games"][name.lower()] = path
-        self.save_config()
+        with self._lock:
+            self.settings["learned_games"][name.lower()] = path
+            self._persist("games", name.lower(), path)
     
     def get_app_path(self, name):
         """Get application path by name"""
@@ -108,41 +259,140 @@ class Config:
         """Get game path by name"""
         return self.settings["learned_games"].get(name.lower())
     
-    def add_to_history(self, user_input, anna_response):
+    def add_to_history(self, user_input, anna_response, action=None):
         """Add conversation to history"""
-        self.settings["memory"]["conversation_history"].append({
+        entry = {
+            "timestamp": datetime.now().isoformat(),
             "user": user_input,
             "anna": anna_response
-        })
-        # Keep only last 50 conversations
-        if len(self.settings["memory"]["conversation_history"]) > 50:
-            self.settings["memory"]["conversation_history"] = \
-                self.settings["memory"]["conversation_history"][-50:]
-        self.save_config()
+        }
+        if action:
+            entry["action"] = action
+        self.journal.append(entry)
     
     def get_history(self, count=10):
         """Get recent conversation history"""
-        history = self.settings["memory"]["conversation_history"]
-        return history[-count:] if history else []
+        return self.journal.tail(count)
+    
+    def get_history_page(self, page=1, page_size=20):
+        """Get one page of history (page 1 is the most recent)"""
+        return self.journal.read_page(page, page_size)
+    
+    def _migrate_history(self):
+        """One-shot: move the old 50-entry history list into the journal"""
+        history = self.settings["memory"].get("conversation_history", [])
+        if not history:
+            return
+        
+        if self.journal.is_empty():
+            for entry in history:
+                self.journal.append(entry)
+        
+        with self._lock:
+            self.settings["memory"]["conversation_history"] = []
+            self.storage.clear_history(self.settings)
+        logger.log_action("migrate_history", f"{len(history)} entries", True)
     
     def update_context(self, key, value):
         """Update user context"""
-        self.settings["memory"]["user_context"][key] = value
-        self.save_config()
+        with self._lock:
+            self.settings["memory"]["user_context"][key] = value
+            self._persist("context", key, value)
     
     def get_context(self, key, default=None):
         """Get user context value"""
         return self.settings["memory"]["user_context"].get(key, default)
     
     def save_document(self, name, doc_data):
-        """Save a document to learned documents"""
-        self.settings["learned_documents"][name] = doc_data
-        self.save_config()
+        """Save a document to learned documents (body goes to the blob store)"""
+        doc_meta = self._store_document_body(doc_data)
+        with self._lock:
+            previous = self.settings["learned_documents"].get(name)
+            if previous:
+                self._unindex_document(name, previous)
+            self.settings["learned_documents"][name] = doc_meta
+            self._persist("documents", name, doc_meta)
+            self._index_document(name, doc_meta)
+    
+    def _index_document(self, name, doc_meta):
+        """Register a document in the hash and path lookup tables"""
+        if doc_meta.get("file_hash"):
+            self._docs_by_hash[doc_meta["file_hash"]] = name
+        if doc_meta.get("file_path"):
+            self._docs_by_path[os.path.normcase(doc_meta["file_path"])] = name
+    
+    def _unindex_document(self, name, doc_meta):
+        """Drop a document's lookup entries (only those still pointing at it)"""
+        if self._docs_by_hash.get(doc_meta.get("file_hash")) == name:
+            del self._docs_by_hash[doc_meta["file_hash"]]
+        path = os.path.normcase(doc_meta.get("file_path") or "")
+        if self._docs_by_path.get(path) == name:
+            del self._docs_by_path[path]
+    
+    def find_document_by_hash(self, file_hash):
+        """Name of the learned document with this content hash, or None"""
+        return self._docs_by_hash.get(file_hash)
+    
+    def find_document_by_path(self, file_path):
+        """Name of the learned document read from this path, or None"""
+        return self._docs_by_path.get(os.path.normcase(str(file_path)))
+    
+    def _store_document_body(self, doc_data):
+        """Move the document content and chunk list into the blob store, return metadata only"""
+        if "content" not in doc_data and "chunks" not in doc_data:
+            return doc_data
+        
+        doc_meta = {k: v for k, v in doc_data.items() if k not in ("content", "chunks")}
+        if "content" in doc_data:
+            content = doc_data["content"] or ""
+            key = doc_data.get("file_hash") or BlobStore.content_key(content)
+            self.blobs.put(key, content)
+            doc_meta["content_key"] = key
+            doc_meta["content_chars"] = len(content)
+        
+        if "chunks" in doc_data:
+            # Keyed by the content, so the same file always maps to the same chunk list
+            chunks_key = BlobStore.content_key(f"chunks:{doc_meta.get('content_key', '')}")
+            self.blobs.put(chunks_key, json.dumps(doc_data["chunks"]))
+            doc_meta["chunks_key"] = chunks_key
+            doc_meta["chunk_count"] = len(doc_data["chunks"])
+        return doc_meta
+    
+    def _migrate_document_bodies(self):
+        """One-shot: move bodies and chunk lists inlined by older versions out of the settings"""
+        for name, doc_data in list(self.settings["learned_documents"].items()):
+            if "content" in doc_data or "chunks" in doc_data:
+                self.save_document(name, doc_data)
     
     def get_document(self, name):
-        """Get a document by name"""
+        """Get document metadata by name (without the body)"""
         return self.settings["learned_documents"].get(name)
     
+    def get_document_content(self, name):
+        """Load a document body from the blob store"""
+        doc_meta = self.get_document(name)
+        if not doc_meta or not doc_meta.get("content_key"):
+            return ""
+        return self.blobs.get(doc_meta["content_key"]) or ""
+    
+    def get_document_chunks(self, name):
+        """Load a document's chunk list from the blob store ([] for unchunked documents)"""
+        doc_meta = self.get_document(name)
+        key = doc_meta.get("chunks_key") if doc_meta else None
+        if not key:
+            return []
+        
+        with self._lock:
+            if key in self._chunk_cache:
+                self._chunk_cache.move_to_end(key)
+                return self._chunk_cache[key]
+        chunks = json.loads(self.blobs.get(key) or "[]")
+        with self._lock:
+            self._chunk_cache[key] = chunks
+            if len(self._chunk_cache) > 8:
+                self._chunk_cache.popitem(last=False)
+        return chunks
+    
     def list_all_documents(self):
         """List all document names"""
         return list(self.settings["learned_documents"].keys())
@@ -0,0 +1,51 @@
+"""
+Anna AI Assistant - Context Cache
+Memoizes rendered prompt sections until the data behind them changes
+"""
+
+import threading
+from collections import Counter
+
+
+class SectionCache:
+    """Per-section render cache keyed by a version stamp"""
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+    
+    def get(self, name, version, render):
+        """Return the cached text for a section, re-rendering only if its version changed"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                self.hits[name] += 1
+                return entry[1]
+            self.misses[name] += 1
+        
+        text = render()
+        with self._lock:
+            self._entries[name] = (version, text)
+        return text
+    
+    def invalidate(self, name=None):
+        """Drop one section (or everything) from the cache"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+    
+    def stats(self):
+        """Hit/miss counters per section plus totals"""
+        with self._lock:
+            sections = sorted(set(self.hits) | set(self.misses))
+            stats = {name: {"hits": self.hits[name], "misses": self.misses[name]} for name in sections}
+            stats["total"] = {"hits": sum(self.hits.values()), "misses": sum(self.misses.values())}
+        return stats
+
+
+# Global context cache instance
+context_cache = SectionCache()
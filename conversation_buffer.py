@@ -0,0 +1,86 @@
+"""
+Anna AI Assistant - Conversation Buffer
+Fixed-capacity ring buffer of compact exchange records
+"""
+
+import threading
+
+
+def compact_action(action_data):
+    """Reduce an action payload to a short label (e.g. "open_app: chrome")"""
+    if not action_data or not isinstance(action_data, dict):
+        return None
+    action = action_data.get("action", "none")
+    if action == "none":
+        return None
+    target = action_data.get("target") or action_data.get("query") or action_data.get("url") or ""
+    return f"{action}: {str(target)[:80]}" if target else action
+
+
+class Exchange:
+    """One conversation turn (dict-style access kept for existing callers)"""
+    
+    __slots__ = ("timestamp", "user", "anna", "action")
+    
+    def __init__(self, timestamp, user, anna, action=None):
+        self.timestamp = timestamp
+        self.user = user
+        self.anna = anna
+        self.action = action
+    
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        """dict.get equivalent"""
+        return getattr(self, key, default) if key in self.__slots__ else default
+    
+    def to_dict(self):
+        """Plain dict copy"""
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class ConversationBuffer:
+    """Keeps the newest `capacity` exchanges; older ones are evicted"""
+    
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return self._size
+    
+    def __bool__(self):
+        return self._size > 0
+    
+    def append(self, exchange):
+        """Add an exchange, evicting the oldest when full"""
+        with self._lock:
+            if self._size < self.capacity:
+                self._items[(self._start + self._size) % self.capacity] = exchange
+                self._size += 1
+            else:
+                self._items[self._start] = exchange
+                self._start = (self._start + 1) % self.capacity
+                self.evicted += 1
+    
+    def recent(self, count):
+        """Newest `count` exchanges, oldest first"""
+        with self._lock:
+            count = min(max(count, 0), self._size)
+            first = self._start + self._size - count
+            return [self._items[(first + i) % self.capacity] for i in range(count)]
+    
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self._items = [None] * self.capacity
+            self._start = 0
+            self._size = 0
+            self.evicted = 0
@@ -4,27 +4,29 @@ Handles PDF and text file reading, extraction, and storage
 """
 
 import os
+import re
+import bisect
 import hashlib
 from pathlib import Path
 from PyPDF2 import PdfReader
 from logger import logger
 from config import config
-import google.generativeai as genai
+from resilience import resilient_llm
 
 
 class DocumentProcessor:
     """Process and extract content from documents"""
     
     def __init__(self):
-        # Configure Gemini for summarization
-        if config.gemini_api_key:
-            genai.configure(api_key=config.gemini_api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.model = None
+        # Model backend for summarization (None when it isn't usable)
+        self.model = resilient_llm if resilient_llm.available else None
         
         # Max text length before summarization (chars)
         self.max_full_text_length = 50000  # ~50 pages
+        
+        # Chunking: overlapping passages for retrieval
+        self.chunk_chars = 1000
+        self.chunk_overlap = 150
     
     def process_file(self, file_path):
         """Process a file and extract its content"""
@@ -34,44 +36,66 @@ class DocumentProcessor:
             
             file_path = Path(file_path)
             file_ext = file_path.suffix.lower()
+            if file_ext not in ['.pdf', '.txt', '.md', '.log']:
+                return {"success": False, "message": f"Unsupported file type: {file_ext}"}
+            
+            # Already learned? Same path/mtime/size skips even hashing the file
+            stat = file_path.stat()
+            known = self._find_unchanged(file_path, stat)
+            file_hash = None
+            if not known:
+                file_hash = self._hash_file(str(file_path))
+                known = config.find_document_by_hash(file_hash) if file_hash else None
+            if known:
+                logger.log_action("document_dedupe", str(file_path), True, f"Known as {known}")
+                return {
+                    "success": True,
+                    "message": f"Already learned {known}",
+                    "data": config.get_document(known),
+                    "duplicate": True
+                }
             
-            # Extract text based on file type
+            # Extract text based on file type (PDFs keep the offset where each page starts)
+            page_starts = [0]
             if file_ext == '.pdf':
-                text = self.extract_from_pdf(str(file_path))
-            elif file_ext in ['.txt', '.md', '.log']:
-                text = self.extract_from_text(str(file_path))
+                text, page_starts = self.extract_pdf_pages(str(file_path))
             else:
-                return {"success": False, "message": f"Unsupported file type: {file_ext}"}
+                text = self.extract_from_text(str(file_path))
             
             if not text:
                 return {"success": False, "message": "Could not extract text from file"}
             
             # Generate metadata
             filename = file_path.name
-            file_hash = self._hash_file(str(file_path))
+            
+            # Split into overlapping chunks, each with its own summary and page range
+            chunks = self.chunk_document(text, page_starts)
             
             # Decide if we need to summarize
             if len(text) > self.max_full_text_length:
-                # Large file - create summary
-                summary = self._summarize_text(text[:self.max_full_text_length * 2])  # Use more text for summary
-                stored_content = summary
+                # Large file - summarize chunk summaries sampled across the whole document
+                step = max(len(chunks) * 200 // 10000, 1)
+                outline = "\n".join(chunk["summary"] for chunk in chunks[::step])
+                summary = self._summarize_text(outline)
                 is_summarized = True
             else:
-                # Small file - store full content
-                stored_content = text
                 summary = self._create_brief_summary(text)
                 is_summarized = False
             
-            # Create document data
+            # Create document data (text and chunks go to the blob store; chunks point into the text)
             document_data = {
                 "filename": filename,
                 "file_path": str(file_path),
                 "file_hash": file_hash,
-                "content": stored_content,
+                "file_mtime": stat.st_mtime,
+                "file_size": stat.st_size,
+                "content": text,
                 "summary": summary,
                 "is_summarized": is_summarized,
                 "file_type": file_ext,
-                "size_chars": len(text)
+                "size_chars": len(text),
+                "page_count": len(page_starts),
+                "chunks": chunks
             }
             
             return {
@@ -86,19 +110,86 @@ class DocumentProcessor:
     
     def extract_from_pdf(self, file_path):
         """Extract text from PDF file"""
+        text, _ = self.extract_pdf_pages(file_path)
+        return text
+    
+    def extract_pdf_pages(self, file_path):
+        """Extract text from PDF file along with the character offset of each page"""
         try:
             reader = PdfReader(file_path)
-            text = ""
+            parts = []
+            page_starts = []
+            offset = 0
             
             for page in reader.pages:
-                text += page.extract_text() + "\n"
+                page_text = (page.extract_text() or "").strip()
+                page_starts.append(offset)
+                parts.append(page_text)
+                offset += len(page_text) + 1  # Pages are joined with a newline
             
             logger.log_action("extract_pdf", file_path, True)
-            return text.strip()
+            return "\n".join(parts), page_starts or [0]
             
         except Exception as e:
             logger.log_error("PDF_EXTRACT", str(e), file_path)
-            return None
+            return None, [0]
+    
+    def chunk_document(self, text, page_starts=None):
+        """Split text into overlapping chunks with char offsets, pages and a summary"""
+        page_starts = page_starts or [0]
+        chunks = []
+        start = 0
+        
+        while start < len(text):
+            end = min(start + self.chunk_chars, len(text))
+            if end < len(text):
+                # Prefer to end on a sentence, then on whitespace
+                boundary = max(text.rfind(". ", start, end), text.rfind("\n", start, end))
+                if boundary <= start + self.chunk_chars // 2:
+                    boundary = text.rfind(" ", start, end)
+                if boundary > start + self.chunk_chars // 2:
+                    end = boundary + 1
+            
+            passage = text[start:end]
+            if passage.strip():
+                chunks.append({
+                    "index": len(chunks),
+                    "start": start,
+                    "end": end,
+                    "page_start": self._page_at(page_starts, start),
+                    "page_end": self._page_at(page_starts, max(end - 1, start)),
+                    "summary": self._summarize_chunk(passage)
+                })
+            
+            if end >= len(text):
+                break
+            # Next chunk overlaps this one, starting on a sentence (or word) if possible
+            next_start = max(end - self.chunk_overlap, start + 1)
+            sentence = text.find(". ", next_start, end)
+            space = text.find(" ", next_start, end)
+            if sentence != -1:
+                start = sentence + 2
+            elif space != -1:
+                start = space + 1
+            else:
+                start = next_start
+        
+        return chunks
+    
+    def _page_at(self, page_starts, offset):
+        """1-based page number containing a character offset"""
+        return max(bisect.bisect_right(page_starts, offset), 1)
+    
+    def _summarize_chunk(self, passage, max_chars=200):
+        """Extractive chunk summary: its leading sentences (no API call per chunk)"""
+        passage = " ".join(passage.split())
+        sentences = re.split(r'(?<=[.!?])\s+', passage)
+        summary = ""
+        for sentence in sentences:
+            if summary and len(summary) + len(sentence) + 1 > max_chars:
+                break
+            summary = f"{summary} {sentence}".strip()
+        return summary[:max_chars]
     
     def extract_from_text(self, file_path):
         """Extract text from text file"""
@@ -113,11 +204,22 @@ class DocumentProcessor:
             logger.log_error("TEXT_EXTRACT", str(e), file_path)
             return None
     
+    def _find_unchanged(self, file_path, stat):
+        """Name of a learned document read from this path with the same mtime and size"""
+        known = config.find_document_by_path(file_path)
+        doc = config.get_document(known) if known else None
+        if doc and doc.get("file_mtime") == stat.st_mtime and doc.get("file_size") == stat.st_size:
+            return known
+        return None
+    
     def _hash_file(self, file_path):
         """Generate hash of file for duplicate detection"""
         try:
+            digest = hashlib.md5()
             with open(file_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            return digest.hexdigest()
         except:
             return None
     
@@ -125,7 +227,7 @@ class DocumentProcessor:
         """Create AI summary of large text"""
         if not self.model:
             # Fallback: just take first N characters
-            return text[:1000] + "...\n[Document too large for full storage. Gemini API not configured for summarization.]"
+            return text[:1000] + "...\n[Gemini API not configured for summarization.]"
         
         try:
             prompt = f"""Summarize the following document concisely. Include:
@@ -138,7 +240,8 @@ Document:
 
 Provide a clear, useful summary in 200-300 words."""
             
-            response = self.model.generate_content(prompt)
+            # Long input: allow more time than an interactive reply
+            response = self.model.generate(prompt, deadline=config.llm_deadline * 2)
             return response.text.strip()
             
         except Exception as e:
@@ -157,7 +260,7 @@ Provide a clear, useful summary in 200-300 words."""
 
 {text[:500]}"""
             
-            response = self.model.generate_content(prompt)
+            response = self.model.generate(prompt)
             return response.text.strip()
             
         except:
@@ -9,6 +9,49 @@ import threading
 from datetime import datetime
 
 
+class PinPrompt:
+    """A PIN dialog opened on the Tk thread; wait() blocks the calling thread until it closes"""
+    
+    def __init__(self, root, title, prompt):
+        self.root = root
+        self.pin = None
+        self._window = None
+        self._done = threading.Event()
+        root.after(0, self._open, title, prompt)
+    
+    def _open(self, title, prompt):
+        if self._done.is_set():
+            return
+        self._window = tk.Toplevel(self.root)
+        self._window.title(title)
+        self._window.transient(self.root)
+        tk.Label(self._window, text=prompt, padx=10, pady=10).pack()
+        entry = tk.Entry(self._window, show='*')
+        entry.pack(padx=10)
+        entry.bind('<Return>', lambda event: self._finish(entry.get()))
+        tk.Button(self._window, text="OK", command=lambda: self._finish(entry.get())).pack(pady=10)
+        self._window.protocol("WM_DELETE_WINDOW", lambda: self._finish(None))
+        entry.focus_set()
+    
+    def _finish(self, pin):
+        """Tk thread: record the answer and take the window down"""
+        if self._done.is_set():
+            return
+        self.pin = pin or None
+        if self._window is not None:
+            self._window.destroy()
+        self._done.set()
+    
+    def wait(self):
+        """The PIN entered, or None if the dialog was cancelled or closed"""
+        self._done.wait()
+        return self.pin
+    
+    def close(self):
+        """Dismiss the dialog without a PIN (safe from any thread)"""
+        self.root.after(0, self._finish, None)
+
+
 class AnnaGUI:
     """Modern GUI for Anna AI Assistant"""
     
@@ -236,6 +279,25 @@ class AnnaGUI:
         self.chat_display.see(tk.END)
         self.chat_display.config(state='disabled')
     
+    def begin_message(self, sender, message_type='anna'):
+        """Start a message whose text is streamed in with append_message_text()"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, f"[{timestamp}] {sender}: ", message_type)
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state='disabled')
+    
+    def append_message_text(self, text):
+        """Append streamed text to the message started last"""
+        self.chat_display.config(state='normal')
+        self.chat_display.insert(tk.END, text)
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state='disabled')
+    
+    def end_message(self):
+        """Close a streamed message"""
+        self.append_message_text("\n\n")
+    
     def send_message(self):
         """Send user message"""
         message = self.input_box.get().strip()
@@ -288,6 +350,10 @@ class AnnaGUI:
         else:
             self.add_message("System", f"✗ {message}", 'error')
     
+    def ask_pin(self, title, prompt):
+        """Open a PIN dialog on the Tk thread; returns a PinPrompt to wait() on or close()"""
+        return PinPrompt(self.root, title, prompt)
+    
     def run(self):
         """Start the GUI main loop"""
         self.root.mainloop()
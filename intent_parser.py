@@ -0,0 +1,179 @@
+"""
+Anna AI Assistant - Intent Parser
+Local fast path that maps common commands to actions without a model round trip
+"""
+
+import re
+import threading
+import time
+from config import config
+
+
+# Filler the user may wrap a command in ("hey anna, please open chrome now")
+LEAD_PATTERN = re.compile(r"^(?:(?:hey|ok|okay)\s+)?(?:anna\b[\s,:]*)?(?:(?:please|can you|could you|would you)\s+)*")
+TRAIL_PATTERN = re.compile(r"(?:[\s,]+(?:please|now|for me|thanks|thank you))*[\s.!?]*$")
+
+# Bare "name.tld" only counts as a website for these endings; file extensions
+# (notes.txt, main.py, setup.exe) go to the model
+WEB_TLDS = {
+    "com", "org", "net", "edu", "gov", "io", "dev", "ai", "co", "us", "uk", "ca", "au", "de",
+    "fr", "es", "it", "nl", "jp", "in", "tv", "me", "info", "biz", "news", "blog", "site", "online",
+}
+
+KEY_NAME = r"(?:ctrl|control|alt|shift|win|enter|return|tab|esc|escape|space|backspace|delete|del|home|end|pageup|pagedown|up|down|left|right|f\d{1,2}|[a-z0-9])"
+
+
+class IntentParser:
+    """Compiled grammar over the action list; anything it isn't sure about goes to Gemini"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names_version = None
+        self._name_rules = []
+        self.hits = 0
+        self.misses = 0
+        self.match_seconds = 0.0
+        # Running average of real model calls, used to estimate the time a hit saves
+        self.model_latency = None
+        self.saved_seconds = 0.0
+        
+        self._fixed_rules = [
+            (re.compile(r"^(?:turn |crank )?(?:the )?volume up$|^turn it up$|^louder$|^(?:increase|raise) (?:the )?volume$"),
+             lambda m: ({"action": "system_control", "target": "volume_up"}, "Turning the volume up.")),
+            (re.compile(r"^(?:turn )?(?:the )?volume down$|^turn it down$|^quieter$|^(?:decrease|lower) (?:the )?volume$"),
+             lambda m: ({"action": "system_control", "target": "volume_down"}, "Turning the volume down.")),
+            (re.compile(r"^(?:un)?mute(?: (?:the )?(?:volume|sound|audio))?$|^(?:volume|sound) (?:un)?mute$"),
+             lambda m: ({"action": "system_control", "target": "volume_mute"}, "Toggling mute.")),
+            (re.compile(r"^(?:set |change )?(?:the )?(?:screen )?brightness (?:to )?(?P<level>\d{1,3})(?: ?%| percent)?$"),
+             self._brightness),
+            (re.compile(r"^(?:toggle (?:the )?wi-?fi|wi-?fi toggle)$"),
+             lambda m: ({"action": "system_control", "target": "wifi_toggle"}, "Toggling Wi-Fi.")),
+            (re.compile(r"^(?:search|look up) (?P<engine>google|youtube|bing|duckduckgo) for (?P<query>.+)$"),
+             self._web_search),
+            (re.compile(r"^(?:search|look up) (?:for )?(?P<query>.+?) on (?P<engine>google|youtube|bing|duckduckgo)$"),
+             self._web_search),
+            (re.compile(r"^search (?:the web|online) for (?P<query>.+)$"),
+             self._web_search),
+            (re.compile(r"^(?:open|go to|visit|browse to) (?P<url>(?:https?://)?(?:www\.)?[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}(?:/\S*)?)$"),
+             self._open_url),
+            (re.compile(rf"^press (?:the )?(?P<key>{KEY_NAME}(?: ?\+ ?{KEY_NAME})*)(?: key)?$"),
+             self._press_key),
+        ]
+    
+    def _brightness(self, match):
+        """Brightness with a level in range, otherwise let the model ask"""
+        level = int(match.group("level"))
+        if level > 100:
+            return None
+        return {"action": "system_control", "target": "brightness", "level": level}, f"Setting brightness to {level}%."
+    
+    def _web_search(self, match):
+        """Web search action (engine defaults to google)"""
+        query = match.group("query").strip()
+        groups = match.groupdict()
+        engine = groups.get("engine") or "google"
+        return {"action": "web_search", "query": query, "engine": engine}, f"Searching {engine.capitalize()} for {query}."
+    
+    def _open_url(self, match):
+        """URL with a scheme, www. or a website TLD; anything else may be a file name"""
+        url = match.group("url")
+        if not re.match(r"https?://|www\.", url):
+            host = url.split("/", 1)[0]
+            if host.rsplit(".", 1)[-1] not in WEB_TLDS:
+                return None
+        return {"action": "open_url", "url": url}, f"Opening {url}."
+    
+    def _press_key(self, match):
+        """Key or combo in pyautogui spelling"""
+        key = re.sub(r" ?\+ ?", "+", match.group("key"))
+        key = key.replace("control", "ctrl").replace("return", "enter").replace("escape", "esc")
+        return {"action": "press_key", "key": key}, f"Pressing {key}."
+    
+    def _compile_names(self):
+        """(Re)build the open/launch rules from learned app and game names"""
+        apps = config.settings.get("learned_apps", {})
+        games = config.settings.get("learned_games", {})
+        # Names are only ever added, so the counts double as a version
+        version = (len(apps), len(games))
+        if version == self._names_version:
+            return self._name_rules
+        
+        def alternation(names):
+            # Longest first so "visual studio code" wins over "visual studio"
+            return "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        
+        rules = []
+        if games:
+            rules.append((
+                re.compile(rf"^(?:launch|play|start|open|run) (?:the game )?(?P<name>{alternation(games)})(?: game)?$"),
+                lambda m: ({"action": "launch_game", "target": m.group("name")}, f"Launching {m.group('name')}.")
+            ))
+        if apps:
+            rules.append((
+                re.compile(rf"^(?:open|launch|start|run) (?:the )?(?P<name>{alternation(apps)})(?: app| application)?$"),
+                lambda m: ({"action": "open_app", "target": m.group("name")}, f"Opening {m.group('name')}.")
+            ))
+        
+        self._name_rules = rules
+        self._names_version = version
+        return rules
+    
+    def normalize(self, text):
+        """Lowercase and strip greetings, politeness and trailing punctuation"""
+        text = " ".join(text.lower().split())
+        text = LEAD_PATTERN.sub("", text, count=1)
+        return TRAIL_PATTERN.sub("", text, count=1)
+    
+    def parse(self, user_input):
+        """Return {"action", "response"} for a confident match, else None"""
+        start = time.perf_counter()
+        result = None
+        text = self.normalize(user_input or "")
+        
+        # Compound requests ("open chrome and search for x") need the model
+        if text and " and " not in text and " then " not in text:
+            with self._lock:
+                rules = self._compile_names() + self._fixed_rules
+            for pattern, build in rules:
+                match = pattern.match(text)
+                if match:
+                    built = build(match)
+                    if built:
+                        result = {"action": built[0], "response": built[1]}
+                    break
+        
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.match_seconds += elapsed
+            if result:
+                self.hits += 1
+                if self.model_latency is not None:
+                    self.saved_seconds += max(self.model_latency - elapsed, 0.0)
+            else:
+                self.misses += 1
+        return result
+    
+    def record_model_latency(self, seconds):
+        """Feed in the duration of a real model call"""
+        with self._lock:
+            if self.model_latency is None:
+                self.model_latency = seconds
+            else:
+                self.model_latency = 0.8 * self.model_latency + 0.2 * seconds
+    
+    def stats(self):
+        """Hit rate, average match time and estimated model time saved"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "avg_match_us": self.match_seconds / total * 1e6 if total else 0.0,
+                "model_latency": self.model_latency,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+# Global intent parser instance
+intent_parser = IntentParser()
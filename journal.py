@@ -0,0 +1,199 @@
+"""
+Anna AI Assistant - Conversation Journal
+Append-only JSONL history split into size-rotated segments
+"""
+
+import gzip
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from logger import logger
+
+
+class ConversationJournal:
+    """Durable conversation history bounded by disk usage instead of entry count"""
+    
+    def __init__(self, directory, max_segment_bytes=1024 * 1024,
+                 max_total_bytes=64 * 1024 * 1024, compact_interval=300):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_total_bytes = max_total_bytes
+        self.compact_interval = compact_interval
+        
+        self._lock = threading.Lock()
+        self._compact_needed = threading.Event()
+        self._closed = False
+        
+        # Keep appending to the newest plain segment, or start a fresh one
+        segments = self._segments()
+        if not segments:
+            self._active_seq = 1
+        elif segments[-1][1].suffix == ".jsonl":
+            self._active_seq = segments[-1][0]
+        else:
+            self._active_seq = segments[-1][0] + 1
+        self._active = open(self._segment_path(self._active_seq), 'ab')
+        
+        threading.Thread(target=self._compact_loop, daemon=True).start()
+        self._compact_needed.set()
+    
+    def _segment_path(self, seq, compressed=False):
+        """Path of a segment file"""
+        name = f"{seq:08d}.jsonl"
+        return self.directory / (name + ".gz" if compressed else name)
+    
+    def _segments(self):
+        """All segments as (seq, path), oldest first"""
+        segments = []
+        for path in self.directory.iterdir():
+            name = path.name
+            if name.endswith(".jsonl") or name.endswith(".jsonl.gz"):
+                try:
+                    segments.append((int(name.split(".")[0]), path))
+                except ValueError:
+                    continue
+        return sorted(segments)
+    
+    def is_empty(self):
+        """Check if the journal has no entries"""
+        return not any(path.stat().st_size for _, path in self._segments())
+    
+    def append(self, entry):
+        """Append one entry, rotating the active segment when it is full"""
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            self._active.write(line)
+            self._active.flush()
+            if self._active.tell() >= self.max_segment_bytes:
+                self._rotate()
+    
+    def _rotate(self):
+        """Seal the active segment and start a new one (lock held)"""
+        self._active.close()
+        self._active_seq += 1
+        self._active = open(self._segment_path(self._active_seq), 'ab')
+        self._compact_needed.set()
+    
+    def _iter_reversed(self, path):
+        """Entries of one segment, newest first"""
+        if path.suffix == ".gz":
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            for line in reversed(lines):
+                entry = self._parse(line)
+                if entry is not None:
+                    yield entry
+            return
+        
+        # Plain segment: read backwards in blocks so tail reads stay cheap
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            while position > 0:
+                size = min(8192, position)
+                position -= size
+                f.seek(position)
+                block = f.read(size) + remainder
+                lines = block.split(b"\n")
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    entry = self._parse(line.decode('utf-8', errors='ignore'))
+                    if entry is not None:
+                        yield entry
+            if remainder:
+                entry = self._parse(remainder.decode('utf-8', errors='ignore'))
+                if entry is not None:
+                    yield entry
+    
+    def _parse(self, line):
+        """Parse a journal line (skips blanks and torn writes)"""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    
+    def _iter_newest(self):
+        """All entries, newest first"""
+        with self._lock:
+            self._active.flush()
+            segments = self._segments()
+        for _, path in reversed(segments):
+            if not path.exists() and path.suffix == ".jsonl":
+                # Segment was compressed since we listed it
+                path = path.with_name(path.name + ".gz")
+            try:
+                yield from self._iter_reversed(path)
+            except FileNotFoundError:
+                # Segment expired while we were reading
+                continue
+    
+    def tail(self, count=10):
+        """Last `count` entries, oldest first"""
+        entries = []
+        for entry in self._iter_newest():
+            if len(entries) >= count:
+                break
+            entries.append(entry)
+        return list(reversed(entries))
+    
+    def read_page(self, page=1, page_size=20):
+        """One page of history counted back from the newest entry, oldest first"""
+        skip = max(page - 1, 0) * page_size
+        entries = []
+        for index, entry in enumerate(self._iter_newest()):
+            if index < skip:
+                continue
+            if len(entries) >= page_size:
+                break
+            entries.append(entry)
+        return list(reversed(entries))
+    
+    def _compact_loop(self):
+        """Background compaction: compress sealed segments, enforce disk policy"""
+        while not self._closed:
+            self._compact_needed.wait(self.compact_interval)
+            self._compact_needed.clear()
+            if self._closed:
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                logger.log_error("JOURNAL_COMPACT", str(e), str(self.directory))
+    
+    def compact(self):
+        """Gzip sealed segments and drop the oldest ones over the size limit"""
+        with self._lock:
+            active_seq = self._active_seq
+        
+        for seq, path in self._segments():
+            if seq >= active_seq or path.suffix == ".gz":
+                continue
+            compressed = self._segment_path(seq, compressed=True)
+            tmp_path = compressed.with_suffix(".gz.tmp")
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, compressed)
+            path.unlink()
+        
+        segments = self._segments()
+        total = sum(path.stat().st_size for _, path in segments)
+        for seq, path in segments:
+            if total <= self.max_total_bytes or seq >= active_seq:
+                break
+            total -= path.stat().st_size
+            path.unlink()
+            logger.log_action("journal_expire", path.name, True)
+    
+    def close(self):
+        """Stop compaction and close the active segment"""
+        self._closed = True
+        self._compact_needed.set()
+        with self._lock:
+            self._active.close()
@@ -0,0 +1,310 @@
+"""
+Anna AI Assistant - LLM Backend
+One interface over Gemini, a record/replay file and a local HTTP stand-in server
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.request
+from datetime import timedelta
+from pathlib import Path
+from config import config
+from logger import logger
+from intent_parser import intent_parser
+from prompt_assembler import estimate_tokens
+
+try:
+    import google.generativeai as genai
+    from google.generativeai import caching
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+    genai = None
+    caching = None
+
+
+DEFAULT_MODEL = 'gemini-2.5-flash'
+# Smallest system instruction (in tokens) Gemini accepts for an explicit context cache
+CACHE_MIN_TOKENS = {"pro": 4096}
+CACHE_MIN_TOKENS_DEFAULT = 1024
+
+
+class Usage:
+    """Token counts shaped like Gemini's usage_metadata"""
+    
+    __slots__ = ("prompt_token_count", "candidates_token_count", "cached_content_token_count")
+    
+    def __init__(self, prompt_token_count=0, candidates_token_count=0, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+    
+    def to_dict(self):
+        """Plain dict copy (for JSON)"""
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class LLMResponse:
+    """A reply or stream chunk: .text and .usage_metadata, like a Gemini response"""
+    
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def split_chunks(text, chunk_chars=24):
+    """Cut a reply into stream chunks on word boundaries"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        space = text.rfind(" ", start, end)
+        if end < len(text) and space > start:
+            end = space + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def stand_in_reply(prompt):
+    """Deterministic offline reply: local intent match, else a fixed answer"""
+    turns = re.findall(r"User: (.*?)\n\nAnna:", prompt, re.DOTALL)
+    if not turns:
+        # Summaries and other one-shot prompts: echo the tail of the material
+        body = prompt.strip().split("\n\n")[-1]
+        return f"(offline) {body[:400]}"
+    
+    user_input = turns[-1].strip()
+    match = intent_parser.parse(user_input)
+    if match:
+        return f"{json.dumps(match['action'])}\n{match['response']}"
+    return f'{{"action": "none"}}\nI\'m running offline, so I can only handle simple commands right now. You said: "{user_input[:200]}"'
+
+
+class LLMBackend:
+    """Interface: generate() returns an LLMResponse, or an iterator of them when stream=True"""
+    
+    name = "base"
+    available = True
+    
+    def generate(self, prompt, system_instruction=None, stream=False, model=None):
+        """Run one prompt; system_instruction is the static prefix, model overrides the default"""
+        raise NotImplementedError
+    
+    def list_models(self):
+        """Models this backend can serve"""
+        return [self.name]
+    
+    def _local_response(self, text, prompt, system_instruction, stream, chunk_chars=24):
+        """Wrap a locally produced reply, with estimated token counts"""
+        usage = Usage(estimate_tokens(system_instruction) + estimate_tokens(prompt), estimate_tokens(text))
+        if not stream:
+            return LLMResponse(text, usage)
+        chunks = split_chunks(text, chunk_chars) or [""]
+        # Token counts ride on the last chunk, as with Gemini
+        return iter([LLMResponse(chunk, usage if i == len(chunks) - 1 else None)
+                     for i, chunk in enumerate(chunks)])
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini; static instructions are kept in a context cache per instruction text"""
+    
+    name = "gemini"
+    
+    def __init__(self, api_key, model_name=DEFAULT_MODEL, prompt_cache=True, cache_ttl=3600):
+        self.model_name = model_name
+        self.prompt_cache = prompt_cache
+        self.cache_ttl = cache_ttl
+        self.available = bool(api_key) and GENAI_AVAILABLE
+        self._models = {}
+        self._refreshing = set()  # keys whose model is being (re)built outside the lock
+        self._lock = threading.Lock()
+        if self.available:
+            genai.configure(api_key=api_key)
+    
+    def generate(self, prompt, system_instruction=None, stream=False, model=None):
+        """Call Gemini (responses and chunks are the SDK's own objects)"""
+        gemini_model = self._model(model or self.model_name, system_instruction)
+        if stream:
+            return gemini_model.generate_content(prompt, stream=True)
+        return gemini_model.generate_content(prompt)
+    
+    def _model(self, model_name, system_instruction):
+        """GenerativeModel for a model + instructions pair, rebuilt when its cache expires"""
+        if not system_instruction:
+            key = (model_name, None)
+        else:
+            key = (model_name, hashlib.sha1(system_instruction.encode('utf-8')).hexdigest())
+        
+        with self._lock:
+            entry = self._models.get(key)
+            if entry and entry["expires"] > time.time():
+                return entry["model"]
+            if key in self._refreshing:
+                # Another request is creating the cache: the old model is still valid
+                # server-side (it is refreshed early), and a new one is cheap to build
+                if entry:
+                    return entry["model"]
+                return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            self._refreshing.add(key)
+        
+        # The cache is created outside the lock, so other calls don't wait on the network
+        try:
+            model = None
+            if system_instruction and self._cacheable(model_name, system_instruction):
+                try:
+                    # Explicit context cache: the server keeps the instruction tokens
+                    cached = caching.CachedContent.create(
+                        model=f"models/{model_name}",
+                        display_name=f"anna-{key[1][:12]}",
+                        system_instruction=system_instruction,
+                        ttl=timedelta(seconds=self.cache_ttl)
+                    )
+                    model = genai.GenerativeModel.from_cached_content(cached)
+                except Exception as e:
+                    logger.log_debug(f"Context cache unavailable for {model_name}: {e}")
+            if model is None:
+                model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            
+            with self._lock:
+                self._models[key] = {
+                    "model": model,
+                    # Refresh a little before the server-side cache runs out
+                    "expires": time.time() + max(self.cache_ttl - 60, self.cache_ttl / 2)
+                }
+            return model
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def _cacheable(self, model_name, system_instruction):
+        """Whether the instructions are big enough for an explicit context cache
+
+        Smaller ones would only fail the create call on every refresh; Gemini still
+        reuses a repeated instruction prefix implicitly.
+        """
+        if not self.prompt_cache:
+            return False
+        minimum = next((tokens for tier, tokens in CACHE_MIN_TOKENS.items() if tier in model_name),
+                       CACHE_MIN_TOKENS_DEFAULT)
+        return estimate_tokens(system_instruction) >= minimum
+    
+    def list_models(self):
+        """Models that support generateContent"""
+        return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+
+class ReplayBackend(LLMBackend):
+    """Deterministic replies from a JSONL recording, or records another backend into one"""
+    
+    name = "replay"
+    
+    def __init__(self, path, record_from=None):
+        self.path = Path(path)
+        self.inner = record_from
+        self.name = "record" if record_from else "replay"
+        self.available = record_from.available if record_from else True
+        self.hits = 0
+        self.misses = 0
+        self._recordings = {}
+        self._lock = threading.Lock()
+        
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._recordings[entry["key"]] = entry["text"]
+    
+    @staticmethod
+    def key(prompt, system_instruction=None, model=None):
+        """Recording key for one call"""
+        raw = json.dumps([model or "", system_instruction or "", prompt])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def generate(self, prompt, system_instruction=None, stream=False, model=None):
+        """Replay (or record) the reply for this exact prompt"""
+        key = self.key(prompt, system_instruction, model)
+        
+        if self.inner:
+            text = self.inner.generate(prompt, system_instruction, stream=False, model=model).text
+            with self._lock:
+                self._recordings[key] = text
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"key": key, "text": text}) + "\n")
+        else:
+            with self._lock:
+                text = self._recordings.get(key)
+                if text is None:
+                    self.misses += 1
+                    text = stand_in_reply(prompt)
+                else:
+                    self.hits += 1
+        
+        return self._local_response(text, prompt, system_instruction, stream)
+
+
+class HTTPBackend(LLMBackend):
+    """Client for llm_server.py (or anything speaking the same JSON protocol)"""
+    
+    name = "http"
+    
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+    
+    def generate(self, prompt, system_instruction=None, stream=False, model=None):
+        """POST /generate; streamed replies come back as one JSON object per line"""
+        payload = json.dumps({
+            "prompt": prompt,
+            "system_instruction": system_instruction,
+            "model": model,
+            "stream": stream,
+        }).encode('utf-8')
+        request = urllib.request.Request(
+            f"{self.url}/generate", data=payload, headers={"Content-Type": "application/json"}
+        )
+        if stream:
+            return self._stream(request)
+        
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode('utf-8'))
+        return LLMResponse(data.get("text", ""), Usage(**data["usage"]) if data.get("usage") else None)
+    
+    def _stream(self, request):
+        """Yield chunks as the server flushes them"""
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                data = json.loads(line.decode('utf-8'))
+                yield LLMResponse(data.get("text", ""), Usage(**data["usage"]) if data.get("usage") else None)
+    
+    def list_models(self):
+        """GET /models"""
+        with urllib.request.urlopen(f"{self.url}/models", timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+
+def create_backend(name=None):
+    """Backend selected by LLM_BACKEND: gemini, replay, record or http"""
+    name = (name or config.llm_backend).lower()
+    gemini = lambda: GeminiBackend(config.gemini_api_key, config.gemini_model,
+                                   config.prompt_cache, config.prompt_cache_ttl)
+    
+    if name == "http":
+        return HTTPBackend(config.llm_server_url)
+    if name == "replay":
+        return ReplayBackend(config.llm_replay_file)
+    if name == "record":
+        return ReplayBackend(config.llm_replay_file, record_from=gemini())
+    if name != "gemini":
+        logger.log_error("LLM_BACKEND", f"Unknown backend: {name}", "Using gemini")
+    return gemini()
+
+
+# Global LLM backend instance
+llm = create_backend()
@@ -0,0 +1,113 @@
+"""
+Anna AI Assistant - LLM Stand-in Server
+Local HTTP server that answers like the model, with configurable latency, for offline runs
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_backend import ReplayBackend, Usage, split_chunks, stand_in_reply
+from prompt_assembler import estimate_tokens
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """POST /generate, GET /models and GET /health"""
+    
+    protocol_version = "HTTP/1.0"
+    options = None   # argparse namespace, set by serve()
+    replay = None    # ReplayBackend when --replay is given
+    
+    def do_GET(self):
+        if self.path == "/models":
+            self._send_json(["stand-in"])
+        elif self.path == "/health":
+            self._send_json({"ok": True})
+        else:
+            self.send_error(404)
+    
+    def do_POST(self):
+        if self.path != "/generate":
+            self.send_error(404)
+            return
+        
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length).decode('utf-8'))
+        prompt = request.get("prompt", "")
+        system_instruction = request.get("system_instruction")
+        
+        if self.replay:
+            text = self.replay.generate(prompt, system_instruction, model=request.get("model")).text
+        else:
+            text = stand_in_reply(prompt)
+        usage = Usage(estimate_tokens(system_instruction) + estimate_tokens(prompt), estimate_tokens(text))
+        
+        # Time to first token, as a real model would spend on the prompt
+        self._sleep(self.options.latency)
+        
+        if not request.get("stream"):
+            self._sleep(self.options.per_chunk * len(split_chunks(text, self.options.chunk_chars)))
+            self._send_json({"text": text, "usage": usage.to_dict()})
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        chunks = split_chunks(text, self.options.chunk_chars) or [""]
+        for i, chunk in enumerate(chunks):
+            if i:
+                self._sleep(self.options.per_chunk)
+            line = {"text": chunk}
+            if i == len(chunks) - 1:
+                line["usage"] = usage.to_dict()
+            self.wfile.write((json.dumps(line) + "\n").encode('utf-8'))
+            self.wfile.flush()
+    
+    def _sleep(self, seconds):
+        """Delay with optional +/- jitter"""
+        if self.options.jitter:
+            seconds *= 1 + random.uniform(-self.options.jitter, self.options.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+    
+    def _send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        if not self.options.quiet:
+            super().log_message(format, *args)
+
+
+def serve(options):
+    """Run the stand-in until interrupted"""
+    StandInHandler.options = options
+    if options.replay:
+        StandInHandler.replay = ReplayBackend(options.replay)
+    server = ThreadingHTTPServer((options.host, options.port), StandInHandler)
+    print(f"LLM stand-in listening on http://{options.host}:{options.port} "
+          f"(latency {options.latency}s, {options.per_chunk}s per chunk)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Anna LLM stand-in server")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.6, help="Seconds before the first chunk")
+    parser.add_argument('--per-chunk', type=float, default=0.03, help="Seconds between stream chunks")
+    parser.add_argument('--chunk-chars', type=int, default=24, help="Characters per stream chunk")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- fraction applied to delays")
+    parser.add_argument('--replay', help="JSONL recording (from LLM_BACKEND=record) to answer from")
+    parser.add_argument('--quiet', action='store_true', help="Don't log each request")
+    serve(parser.parse_args())
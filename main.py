@@ -3,8 +3,10 @@ Anna AI Assistant - Main Entry Point (GUI + Voice)
 Orchestrates GUI and voice interface with automation
 """
 
+import re
 import sys
 import threading
+from concurrent.futures import Future
 from gui_interface import initialize_gui
 from voice_interface import initialize_voice
 from anna_brain import anna_brain
@@ -13,6 +15,13 @@ from safety import safety
 from config import config
 from memory import memory
 from logger import logger
+from context_cache import context_cache
+from intent_parser import intent_parser
+from response_cache import response_cache
+from resilience import resilient_llm
+from model_router import model_router
+from metrics import request_metrics
+from request_pipeline import RequestPipeline
 
 
 class Anna:
@@ -23,6 +32,8 @@ class Anna:
         self.voice = None
         self.awaiting_pin = False
         self.running = False
+        # Requests run one at a time, in order; corrections cancel what they replace
+        self.pipeline = RequestPipeline(self._run_request, max_pending=config.request_queue_size)
     
     def setup_first_run(self):
         """Setup wizard for first run"""
@@ -75,7 +86,8 @@ class Anna:
             self.setup_first_run()
         
         # Initialize GUI
-        self.gui = initialize_gui(callback=self.handle_user_input)
+        self.pipeline.start()
+        self.gui = initialize_gui(callback=self.submit_user_input)
         
         # Initialize and start voice interface
         self.voice = initialize_voice(callback=self.handle_voice_command)
@@ -96,8 +108,43 @@ class Anna:
         logger.log_action("anna_started", "GUI+Voice", True)
         self.gui.run()
     
-    def handle_user_input(self, user_input):
+    def submit_user_input(self, user_input):
+        """Route input from GUI or voice: commands and PINs now, requests via the pipeline"""
+        try:
+            # Special commands and PINs never wait behind queued requests; commands come
+            # first so "status" or "exit" during a PIN prompt isn't a failed attempt
+            if self.handle_special_commands(user_input):
+                return
+            if self.awaiting_pin and not user_input.startswith("UPLOAD_FILE:"):
+                self.handle_pin_input(user_input)
+                return
+            
+            outcome, detail = self.pipeline.submit(user_input)
+            if outcome == "cancelled":
+                self.gui.add_message("System", f"Cancelled {detail} request(s)" if detail else "Nothing to cancel", 'system')
+            elif outcome == "rejected":
+                self.gui.add_message("System", f"Still busy with {self.pipeline.pending()} queued requests - "
+                                               "try again in a moment", 'error')
+            else:
+                stats = self.pipeline.get_stats()
+                ahead = stats["pending"] - 1 + (1 if stats["running"] else 0)
+                if ahead > 0:
+                    self.gui.update_status(f"Queued ({ahead} ahead)", 'processing')
+        
+        except Exception as e:
+            self.gui.add_message("System", f"Error: {str(e)}", 'error')
+            logger.log_error("SUBMIT_INPUT", str(e), user_input)
+    
+    def _run_request(self, request):
+        """Pipeline handler: one request, with cancellation checkpoints"""
+        if request.is_cancelled():
+            return
+        self.handle_user_input(request.text, request.is_cancelled)
+    
+    def handle_user_input(self, user_input, should_stop=None):
         """Handle text input from GUI"""
+        should_stop = should_stop or (lambda: False)
+        grant = None
         try:
             # Handle file upload
             if user_input.startswith("UPLOAD_FILE:"):
@@ -109,6 +156,11 @@ class Anna:
             if self.handle_special_commands(user_input):
                 return
             
+            # "batch: open chrome; volume up; ..." runs a list of commands as one plan
+            if user_input.lower().startswith("batch:"):
+                self.handle_batch(user_input)
+                return
+            
             # Handle PIN input if awaiting
             if self.awaiting_pin:
                 self.handle_pin_input(user_input)
@@ -117,19 +169,37 @@ class Anna:
             # Update status
             self.gui.update_status("Processing...", 'processing')
             
-            # Process with Anna's brain
-            result = anna_brain.process(user_input)
+            # Dangerous-looking input: collect the PIN while the model is still answering
+            grant = self._preauthorize(user_input)
             
-            # Display Anna's response
-            if result["response"]:
-                self.gui.add_message("Anna", result["response"], 'anna')
-                # Also speak if voice is active and available
-                if self.voice and hasattr(self.voice, 'available') and self.voice.available:
-                    threading.Thread(target=self.voice.speak, args=(result["response"],), daemon=True).start()
+            if config.stream_responses:
+                # Text and action are handled while the reply is still arriving
+                result = self.process_streaming(user_input, should_stop, grant)
+            else:
+                # Process with Anna's brain
+                result = anna_brain.process(user_input)
+                if should_stop():
+                    result["cancelled"] = True
             
-            # Execute action if present
-            if result["action"] and result["action"].get("action") != "none":
-                self.execute_action(user_input, result["action"], result["needs_pin"])
+            if result.get("cancelled"):
+                # Superseded by a newer request: skip actions and don't remember it
+                self.gui.add_message("System", f"Skipped: {user_input[:60]}", 'system')
+                self.gui.update_status("Ready to assist", 'normal')
+                return
+            
+            if not config.stream_responses:
+                # Display Anna's response
+                if result["response"]:
+                    self.gui.add_message("Anna", result["response"], 'anna')
+                    # Also speak if voice is active and available
+                    if self.voice and hasattr(self.voice, 'available') and self.voice.available:
+                        threading.Thread(target=self.voice.speak, args=(result["response"],), daemon=True).start()
+                
+                # Execute action(s) if present
+                if len(result["actions"]) > 1:
+                    self.execute_plan(user_input, result["actions"], result["action_pins"], grant)
+                elif result["actions"]:
+                    self.execute_action(user_input, result["action"], result["needs_pin"], grant)
             
             # Check if user provided a file path (auto-learning)
             self._check_and_save_path(user_input, result["response"])
@@ -139,11 +209,162 @@ class Anna:
             
             # Reset status
             self.gui.update_status("Ready to assist", 'normal')
-            
+        
         except Exception as e:
             self.gui.add_message("System", f"Error: {str(e)}", 'error')
             logger.log_error("HANDLE_INPUT", str(e), user_input)
             self.gui.update_status("Error occurred", 'error')
+        
+        finally:
+            self._release_grant(grant, cancelled=should_stop())
+    
+    def _preauthorize(self, user_input):
+        """Start asking for the PIN as soon as raw input looks dangerous
+
+        Runs the PIN dialog alongside the model call. Returns a Future for a one-time
+        grant token (None if the user declined), or None when the input looks harmless;
+        the returned action still goes through its own PIN check before the grant is used.
+        """
+        if not safety.is_dangerous(user_input):
+            return None
+        
+        grant = Future()
+        # Set once the request is over; a PIN entered after that grants nothing
+        grant.released = threading.Event()
+        grant.dialog = None
+        
+        def collect():
+            try:
+                grant.set_result(self._collect_pin_grant(user_input, grant))
+            except Exception as e:
+                logger.log_error("PIN_PREAUTH", str(e), user_input)
+                grant.set_result(None)
+        
+        threading.Thread(target=collect, daemon=True).start()
+        return grant
+    
+    def _collect_pin_grant(self, user_input, grant):
+        """PIN dialog for a pre-authorization; returns a grant token or None"""
+        self.gui.add_message("System", "⚠️ This request needs PIN confirmation", 'system')
+        if self.voice:
+            self.voice.speak("This request needs your PIN for confirmation")
+        logger.log_audit("PIN_REQUESTED", user_input, "Pre-authorization", False)
+        
+        while True:
+            grant.dialog = self.gui.ask_pin("PIN Required", f"Enter your PIN to allow: {user_input[:60]}")
+            if grant.released.is_set():
+                grant.dialog.close()
+            pin = grant.dialog.wait()
+            if not pin or grant.released.is_set():
+                return None
+            pin_result = safety.verify_pin(pin)
+            if pin_result is True:
+                self.gui.add_message("System", "✓ PIN verified", 'system')
+                return safety.issue_grant(user_input)
+            if pin_result == "LOCKED":
+                self.gui.add_message("System", "❌ Too many failed attempts. Action cancelled.", 'error')
+                return None
+            self.gui.add_message("System", "❌ Incorrect PIN", 'error')
+    
+    def _use_grant(self, grant, user_input, action_data):
+        """Apply a pre-authorization to an action that needs the PIN
+
+        True if the grant was spent on it, False if the user declined the PIN, None when
+        the grant can't cover it (already used, expired) and the PIN must be asked again.
+        """
+        # Waits only if the PIN dialog is still open
+        token = grant.result()
+        if token is None:
+            return False
+        return True if safety.redeem_grant(token, user_input, action_data) else None
+    
+    def _release_grant(self, grant, cancelled=False):
+        """Revoke an unused grant once the request is over (or once its dialog closes)"""
+        if grant is None:
+            return
+        
+        grant.released.set()
+        if not grant.done():
+            # Still asking: take the dialog down and say why
+            if grant.dialog is not None:
+                grant.dialog.close()
+            reason = "the request was cancelled" if cancelled else "that request finished without a protected action"
+            self.gui.add_message("System", f"PIN no longer needed - {reason}", 'system')
+        
+        def revoke(future):
+            if future.result():
+                safety.revoke_grant(future.result())
+        
+        grant.add_done_callback(revoke)
+    
+    def handle_batch(self, user_input):
+        """Interpret a list of commands concurrently, then run their actions as one plan"""
+        commands = [part.strip() for part in re.split(r"[;\n]", user_input.split(":", 1)[1]) if part.strip()]
+        if not commands:
+            self.gui.add_message("System", "Usage: batch: open chrome; volume up; search news", 'system')
+            return
+        
+        self.gui.update_status(f"Interpreting {len(commands)} commands...", 'processing')
+        batch = anna_brain.process_batch(commands)
+        
+        for command, result in zip(commands, batch["results"]):
+            if result["response"]:
+                self.gui.add_message("Anna", f"{command}: {result['response']}", 'anna')
+            memory.add_exchange(command, result["response"], result["action"])
+        
+        self.gui.add_message("System", f"Batch: {len(commands)} commands interpreted in {batch['seconds']:.1f}s "
+                                       f"({batch['commands_per_second']:.1f}/s), {len(batch['plan'])} steps", 'system')
+        if batch["plan"]:
+            self.execute_plan(user_input, batch["plan"], batch["plan_pins"])
+        self.gui.update_status("Ready to assist", 'normal')
+    
+    def process_streaming(self, user_input, should_stop=None, grant=None):
+        """Stream Anna's reply into the chat and TTS, running the first action as soon as it parses
+
+        Only a first action that needs no PIN runs early; the rest are collected and go
+        through execute_plan once the reply is complete, so depends_on, blocking after a
+        failed step and the bounded executor apply to them as well.
+        """
+        speaking = self.voice and hasattr(self.voice, 'available') and self.voice.available
+        started = []
+        actions = []
+        pins = []
+        completed = {}
+        
+        def on_text(text):
+            if not started:
+                self.gui.begin_message("Anna")
+                started.append(True)
+            self.gui.append_message_text(text)
+            if speaking:
+                self.voice.speak_stream(text)
+        
+        def on_action(action_data, needs_pin):
+            actions.append(action_data)
+            pins.append(needs_pin)
+            if len(actions) > 1 or needs_pin:
+                return
+            # Close any text shown so far so the action lines don't land mid-message
+            if started:
+                self.gui.end_message()
+                started.clear()
+            completed[0] = self._run_action(action_data)
+        
+        result = anna_brain.process_stream(user_input, on_text=on_text, on_action=on_action,
+                                           should_stop=should_stop)
+        
+        if started:
+            self.gui.end_message()
+        if speaking and result.get("cancelled"):
+            self.voice.discard_stream()
+        elif speaking:
+            self.voice.finish_stream()
+        if not result.get("cancelled") and len(completed) < len(actions):
+            if len(actions) > 1:
+                self.execute_plan(user_input, actions, pins, grant, completed)
+            else:
+                self.execute_action(user_input, actions[0], pins[0], grant)
+        return result
     
     def _check_and_save_path(self, user_input, anna_response):
         """Check if user provided a path and save it automatically"""
@@ -185,7 +406,12 @@ class Anna:
             # Process the document
             result = document_processor.process_file(file_path)
             
-            if result["success"]:
+            if result.get("duplicate"):
+                # Identical file already learned: nothing to extract, summarize or index
+                filename = result["data"]["filename"]
+                self.gui.add_message("System", f"✓ Already learned {filename}", 'system')
+                self.gui.add_message("Anna", f"I already know {filename}:\n\n{result['data']['summary']}", 'anna')
+            elif result["success"]:
                 # Save to memory
                 memory.add_document(result["data"])
                 
@@ -206,7 +432,7 @@ class Anna:
                 self.gui.add_message("System", f"✗ {result['message']}", 'error')
             
             self.gui.update_status("Ready to assist", 'normal')
-            
+        
         except Exception as e:
             self.gui.add_message("System", f"✗ Error processing file: {str(e)}", 'error')
             logger.log_error("FILE_UPLOAD", str(e), file_path)
@@ -218,11 +444,19 @@ class Anna:
         self.gui.add_message("You", f"🎤 {voice_input}", 'user')
         
         # Process same as text input
-        self.handle_user_input(voice_input)
+        self.submit_user_input(voice_input)
     
-    def execute_action(self, user_input, action_data, needs_pin):
+    def execute_action(self, user_input, action_data, needs_pin, grant=None):
         """Execute an action"""
         try:
+            # A PIN already given for this request covers one PIN-gated action
+            if needs_pin and grant is not None:
+                approved = self._use_grant(grant, user_input, action_data)
+                if approved is False:
+                    self.gui.add_message("System", "Action cancelled", 'system')
+                    return
+                needs_pin = approved is None
+            
             # Check if PIN required
             if needs_pin:
                 self.gui.add_message("System", "⚠️ This action requires PIN confirmation", 'system')
@@ -244,21 +478,72 @@ class Anna:
                     self.awaiting_pin = False
                 return
             
-            # Display action
-            action_type = action_data.get("action", "unknown")
-            target = action_data.get("target", "")
-            self.gui.add_action(action_type, target)
-            
-            # Execute
+            self._run_action(action_data)
+        
+        except Exception as e:
+            self.gui.add_message("System", f"Error: {str(e)}", 'error')
+            logger.log_error("EXECUTE_ACTION", str(e), str(action_data))
+    
+    def _run_action(self, action_data):
+        """Show, execute and report an approved action; returns the engine's result"""
+        try:
+            self.gui.add_action(action_data.get("action", "unknown"), action_data.get("target", ""))
             result = automation_engine.execute(action_data)
-            
-            # Display result
             if result:
                 self.gui.add_result(result.get("success", False), result.get("message", ""))
-            
+            return result
+        
         except Exception as e:
             self.gui.add_message("System", f"Error: {str(e)}", 'error')
             logger.log_error("EXECUTE_ACTION", str(e), str(action_data))
+            return {"success": False, "message": str(e)}
+    
+    def execute_plan(self, user_input, actions, pins, grant=None, completed=None):
+        """Execute a multi-step plan; steps that need the PIN are confirmed one by one first
+
+        completed holds the results of steps that already ran while the reply streamed.
+        """
+        completed = completed or {}
+        try:
+            for index, action_data in enumerate(actions):
+                if index not in completed:
+                    self.gui.add_action(action_data.get("action", "unknown"), action_data.get("target", ""))
+            
+            def approve(index, action_data):
+                if not pins[index]:
+                    return True
+                if grant is not None:
+                    approved = self._use_grant(grant, user_input, action_data)
+                    if approved is not None:
+                        return approved
+                return self._confirm_step_with_pin(user_input, action_data)
+            
+            result = automation_engine.execute_plan(actions, approve, completed)
+            for step in result["steps"]:
+                self.gui.add_result(step["success"], f"Step {step['index'] + 1} ({step['action']}): "
+                                                     f"{step['message'] or step['status']}")
+            self.gui.add_result(result["success"], result["message"])
+        
+        except Exception as e:
+            self.gui.add_message("System", f"Error: {str(e)}", 'error')
+            logger.log_error("EXECUTE_PLAN", str(e), str(actions))
+    
+    def _confirm_step_with_pin(self, user_input, action_data):
+        """Ask for the PIN for one plan step; True if verified"""
+        from tkinter import simpledialog
+        
+        self.gui.add_message("System", f"⚠️ Step {action_data.get('action')} requires PIN confirmation", 'system')
+        logger.log_audit("PIN_REQUESTED", user_input, str(action_data), False)
+        pin = simpledialog.askstring("PIN Required", f"Enter your PIN to allow {action_data.get('action')}:", show='*')
+        if not pin:
+            self.gui.add_message("System", "Step cancelled", 'system')
+            return False
+        
+        pin_result = safety.verify_pin(pin)
+        if pin_result is True:
+            return True
+        self.gui.add_message("System", "❌ Incorrect PIN - step skipped", 'error')
+        return False
     
     def handle_pin_input(self, pin_input):
         """Handle PIN verification"""
@@ -303,19 +588,83 @@ class Anna:
             if self.voice:
                 self.voice.speak("Goodbye!")
                 self.voice.stop()
+            self.pipeline.cancel_all()
+            self.pipeline.stop()
+            config.flush()
+            response_cache.save()
             self.gui.quit()
             return True
         
         elif cmd == "status":
+            write_stats = config.get_write_stats()
+            cache_stats = context_cache.stats()
+            fast_stats = intent_parser.stats()
+            reply_stats = response_cache.stats()
+            request_stats = self.pipeline.get_stats()
+            token_stats = anna_brain.token_stats
+            call_stats = resilient_llm.stats()
+            tier_stats = model_router.stats()
+            latency = request_metrics.summary()["timings"].get("total_ms")
+            p = lambda seconds: f"{seconds:.2f}s" if seconds is not None else "-"
+            model_requests = max(token_stats["requests"], 1)
+            cache_detail = ", ".join(
+                f"{name} {counts['hits']}/{counts['hits'] + counts['misses']}"
+                for name, counts in cache_stats.items() if name != "total"
+            )
             status_text = (
                 f"API Key: {'✓' if config.gemini_api_key else '✗'}\n"
                 f"Voice: {'✓ Active' if self.voice and self.voice.is_running() else '✗ Inactive'}\n"
                 f"Learned Apps: {len(config.settings.get('learned_apps', {}))}\n"
-                f"Learned Games: {len(config.settings.get('learned_games', {}))}"
+                f"Learned Games: {len(config.settings.get('learned_games', {}))}\n"
+                f"Config Writes: {write_stats['flushed']} flushes for {write_stats['requested']} changes "
+                f"({write_stats['saved']} saved)\n"
+                f"Context Cache: {cache_stats['total']['hits']} hits, "
+                f"{cache_stats['total']['misses']} misses ({cache_detail or 'no requests yet'})\n"
+                f"Fast Path: {fast_stats['hits']} hits, {fast_stats['misses']} misses "
+                f"({fast_stats['hit_rate']:.0%}, {fast_stats['avg_match_us']:.0f} µs/match, "
+                f"~{fast_stats['saved_seconds']:.1f}s of model time saved)\n"
+                f"Reply Cache: {reply_stats['hits']} hits, {reply_stats['misses']} misses "
+                f"({reply_stats['size']}/{reply_stats['capacity']} entries, {reply_stats['evicted']} evicted, "
+                f"{reply_stats['expired']} expired, {reply_stats['skipped']} not cacheable)\n"
+                f"Requests: {request_stats['completed']} done, {request_stats['cancelled']} cancelled, "
+                f"{request_stats['rejected']} rejected, {request_stats['pending']} queued\n"
+                f"Input Tokens: {token_stats['prompt_tokens'] // model_requests} per request, "
+                f"{token_stats['cached_tokens'] // model_requests} of them cached "
+                f"(~{token_stats['single_prompt_tokens'] // model_requests} before the prompt split)\n"
+                f"Model Calls: {call_stats['calls']} calls, {call_stats['failed']} failed, "
+                f"{call_stats['retries']} retries, {call_stats['timeouts']} timeouts | "
+                f"p50 {p(call_stats['latency']['p50'])}, p95 {p(call_stats['latency']['p95'])}, "
+                f"p99 {p(call_stats['latency']['p99'])} | first chunk p95 {p(call_stats['first_chunk']['p95'])} | "
+                f"circuit {call_stats['breaker']} ({call_stats['trips']} trips, "
+                f"{call_stats['short_circuited']} failed fast)\n"
+                f"Request Latency: " + (
+                    f"p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, p99 {latency['p99']:.0f} ms"
+                    if latency else "no requests yet"
+                ) + "\n"
+                f"Model Tiers: " + ", ".join(
+                    f"{tier} {stats['model']} {stats['requests']} requests (p50 {p(stats['p50'])}, p95 {p(stats['p95'])})"
+                    for tier, stats in tier_stats.items()
+                )
             )
             self.gui.add_message("System", status_text, 'system')
             return True
         
+        elif re.fullmatch(r"history(?: \d+)?", cmd):
+            # "history" shows the latest page, "history 2" the page before it
+            parts = cmd.split()
+            page = int(parts[1]) if len(parts) > 1 else 1
+            entries = config.get_history_page(page, 10)
+            if not entries:
+                self.gui.add_message("System", "No conversation history on that page", 'system')
+                return True
+            
+            lines = [f"Conversation history (page {page}):"]
+            for exchange in entries:
+                lines.append(f"You: {exchange.get('user', '')}")
+                lines.append(f"Anna: {exchange.get('anna', '')}")
+            self.gui.add_message("System", "\n".join(lines), 'system')
+            return True
+        
         elif cmd == "clear":
             # Can't clear in this GUI, but acknowledge
             self.gui.add_message("System", "Chat history is persistent in this session", 'system')
@@ -5,6 +5,12 @@ Handles conversation history, context, and learned information
 
 from datetime import datetime
 from config import config
+from logger import logger
+from search_index import SearchIndex
+from vector_index import VectorIndex, NUMPY_AVAILABLE
+from context_cache import context_cache
+from conversation_buffer import ConversationBuffer, Exchange, compact_action
+from session_summarizer import SessionSummarizer
 import json
 
 
@@ -13,24 +19,49 @@ class Memory:
     
     def __init__(self):
         self.session_context = {}
-        self.current_conversation = []
+        # Newest turns only; every turn is also journaled, so evicted ones stay on disk
+        self.current_conversation = ConversationBuffer(config.conversation_buffer_size)
+        
+        # Turns older than the 3-turn prompt window are folded into a running summary
+        self.summarizer = SessionSummarizer(window=3)
+        
+        # Bumped whenever the data behind a prompt section changes
+        self.versions = {"conversation": 0, "session": 0, "documents": 0}
+        
+        # Full-text index over document content and summaries
+        self.search_index = SearchIndex(config.config_dir / "search_index.db")
+        
+        # Chunk vectors for picking relevant excerpts into the prompt (needs NumPy)
+        self.vector_index = VectorIndex(config.config_dir / "vectors") if NUMPY_AVAILABLE else None
+        # Vectors used to live in one matrix file; they are rebuilt per document below
+        (config.config_dir / "vectors.npz").unlink(missing_ok=True)
+        self._index_missing_documents()
     
     def add_exchange(self, user_input, anna_response, action_taken=None):
         """Add a conversation exchange to memory"""
-        exchange = {
-            "timestamp": datetime.now().isoformat(),
-            "user": user_input,
-            "anna": anna_response,
-            "action": action_taken
-        }
+        action = compact_action(action_taken)
+        exchange = Exchange(datetime.now().isoformat(), user_input, anna_response, action)
         self.current_conversation.append(exchange)
+        self.versions["conversation"] += 1
         
         # Also save to persistent storage
-        config.add_to_history(user_input, anna_response)
+        config.add_to_history(user_input, anna_response, action)
+        self.summarizer.add_turn(user_input, anna_response, action)
     
     def get_recent_context(self, count=5):
         """Get recent conversation for context"""
-        return self.current_conversation[-count:] if self.current_conversation else []
+        recent = self.current_conversation.recent(count)
+        
+        # Older turns of this session were evicted from the buffer; read them back from disk
+        missing = min(count - len(recent), self.current_conversation.evicted)
+        if missing > 0:
+            older = config.get_history(len(recent) + missing)[:missing]
+            recent = [
+                Exchange(entry.get("timestamp"), entry.get("user", ""), entry.get("anna", ""),
+                         entry.get("action"))
+                for entry in older
+            ] + recent
+        return recent
     
     def get_persistent_history(self, count=10):
         """Get persistent conversation history"""
@@ -39,6 +70,7 @@ class Memory:
     def remember(self, key, value):
         """Remember a piece of information"""
         self.session_context[key] = value
+        self.versions["session"] += 1
         config.update_context(key, value)
     
     def recall(self, key, default=None):
@@ -51,73 +83,191 @@ class Memory:
     def forget_session(self):
         """Clear session context (keeps persistent memory)"""
         self.session_context = {}
-        self.current_conversation = []
+        self.current_conversation.clear()
+        self.summarizer.reset()
+        self.versions["session"] += 1
+        self.versions["conversation"] += 1
     
     def add_document(self, doc_data):
         """Add a document to memory"""
         try:
             filename = doc_data.get("filename")
             config.save_document(filename, doc_data)
+            self.search_index.add(filename, doc_data.get("content", ""), doc_data.get("summary", ""))
+            if self.vector_index:
+                self.vector_index.add(filename, doc_data.get("content", ""),
+                                      self._chunk_spans(doc_data.get("chunks")))
+            self.versions["documents"] += 1
             return True
         except Exception as e:
+            logger.log_error("ADD_DOCUMENT", str(e), doc_data.get("filename"))
             return False
     
+    def _index_missing_documents(self):
+        """Index documents learned before the search index existed"""
+        for doc_name in config.list_all_documents():
+            missing_text = doc_name not in self.search_index
+            missing_vectors = self.vector_index is not None and doc_name not in self.vector_index
+            if not (missing_text or missing_vectors):
+                continue
+            
+            doc = self.get_document(doc_name)
+            if missing_text:
+                self.search_index.add(doc_name, doc.get("content", ""), doc.get("summary", ""))
+            if missing_vectors:
+                self.vector_index.add(doc_name, doc.get("content", ""),
+                                      self._chunk_spans(config.get_document_chunks(doc_name)))
+    
+    def _chunk_spans(self, chunks):
+        """(start, end) offsets of a document's chunks, or None for unchunked documents"""
+        return [(chunk["start"], chunk["end"]) for chunk in chunks] if chunks else None
+    
+    def _chunk_at(self, filename, offset):
+        """Chunk metadata containing a character offset"""
+        for chunk in config.get_document_chunks(filename):
+            if chunk["start"] <= offset < chunk["end"]:
+                return chunk
+        return None
+    
+    def get_chunk(self, filename, index):
+        """Get one passage of a document with its offsets, pages and summary"""
+        chunks = config.get_document_chunks(filename)
+        if not chunks or not 0 <= index < len(chunks):
+            return None
+        chunk = dict(chunks[index])
+        chunk["text"] = config.get_document_content(filename)[chunk["start"]:chunk["end"]]
+        return chunk
+    
     def get_document(self, filename):
-        """Get a document by filename"""
-        return config.get_document(filename)
+        """Get a document by filename, loading its content on demand"""
+        doc = config.get_document(filename)
+        if not doc:
+            return None
+        doc = dict(doc)
+        doc["content"] = config.get_document_content(filename)
+        return doc
     
     def list_documents(self):
         """List all stored documents"""
         return config.list_all_documents()
     
-    def search_documents(self, query):
-        """Search for documents containing query"""
+    def search_documents(self, query, limit=10, snippet_chars=200):
+        """Search documents, best BM25 match first, with a snippet around the hit"""
         results = []
-        all_docs = config.list_all_documents()
         
-        for doc_name in all_docs:
+        for hit in self.search_index.search(query, limit):
+            doc_name = hit["filename"]
             doc = config.get_document(doc_name)
-            if doc:
-                content = doc.get("content", "")
-                summary = doc.get("summary", "")
+            if not doc:
+                continue
                 
-                # Simple search in content and summary
-                if query.lower() in content.lower() or query.lower() in summary.lower():
-                    results.append({
-                        "filename": doc_name,
-                        "summary": summary
-                    })
+            result = {
+                "filename": doc_name,
+                "summary": doc.get("summary", ""),
+                "score": hit["score"],
+                "snippet_offsets": None,
+                "snippet": ""
+            }
+            
+            # Only matched documents get their body loaded, for the snippet
+            if hit["offset"] >= 0:
+                content = config.get_document_content(doc_name)
+                start = max(hit["offset"] - snippet_chars // 4, 0)
+                end = min(start + snippet_chars, len(content))
+                result["snippet_offsets"] = [start, end]
+                result["snippet"] = content[start:end]
+                chunk = self._chunk_at(doc_name, hit["offset"])
+                if chunk:
+                    result["chunk"] = chunk["index"]
+                    result["page"] = chunk["page_start"]
+            
+            results.append(result)
         
         return results
     
-    def build_context_string(self):
-        """Build context string for AI prompt"""
-        context_parts = []
+    def find_relevant_chunks(self, query, top_k=3):
+        """Document excerpts most similar to the query"""
+        if not self.vector_index or not query:
+            return []
         
-        # Recent conversation
+        excerpts = []
+        for hit in self.vector_index.search(query, top_k):
+            content = config.get_document_content(hit["filename"])
+            excerpt = " ".join(content[hit["start"]:hit["end"]].split())
+            if not excerpt:
+                continue
+            
+            source = hit["filename"]
+            chunk = self._chunk_at(hit["filename"], hit["start"])
+            if chunk and chunk["page_start"] == chunk["page_end"]:
+                source += f" p.{chunk['page_start']}"
+            elif chunk:
+                source += f" p.{chunk['page_start']}-{chunk['page_end']}"
+            excerpts.append({"filename": hit["filename"], "source": source,
+                             "text": excerpt, "score": hit["score"]})
+        return excerpts
+    
+    def build_context_string(self, query=None):
+        """Build context string for AI prompt (documents filtered by the query)"""
+        sections = self.build_context_sections(query)
+        return "\n".join(section["text"] for section in sections if section["text"])
+    
+    def build_context_sections(self, query=None):
+        """Context sections with their packing priority (lower = kept first)"""
+        # Each section is re-rendered only when its data (or the query) changed
+        doc_query = " ".join(query.lower().split()) if query and self.vector_index else None
+        return [
+            {"name": "summary", "priority": 2, "keep": "tail",
+             "text": context_cache.get("summary", self.summarizer.version, self.summarizer.get_summary)},
+            {"name": "conversation", "priority": 1, "keep": "tail",
+             "text": context_cache.get("conversation", self.versions["conversation"],
+                                       self._render_conversation)},
+            {"name": "session", "priority": 3, "keep": "head",
+             "text": context_cache.get("session", self.versions["session"], self._render_session)},
+            {"name": "documents", "priority": 4, "keep": "head",
+             "text": context_cache.get("documents", (self.versions["documents"], doc_query),
+                                       lambda: self._render_documents(doc_query))},
+        ]
+    
+    def _render_conversation(self):
+        """Recent conversation section"""
         recent = self.get_recent_context(3)
-        if recent:
-            context_parts.append("Recent conversation:")
-            for exchange in recent:
-                context_parts.append(f"User: {exchange['user']}")
-                context_parts.append(f"Anna: {exchange['anna']}")
+        if not recent:
+            return ""
+        lines = ["Recent conversation:"]
+        for exchange in recent:
+            lines.append(f"User: {exchange['user']}")
+            lines.append(f"Anna: {exchange['anna']}")
+        return "\n".join(lines)
         
-        # Session context
-        if self.session_context:
-            context_parts.append("\nCurrent session context:")
-            for key, value in self.session_context.items():
-                context_parts.append(f"{key}: {value}")
+    def _render_session(self):
+        """Session context section"""
+        if not self.session_context:
+            return ""
+        lines = ["\nCurrent session context:"]
+        for key, value in self.session_context.items():
+            lines.append(f"{key}: {value}")
+        return "\n".join(lines)
         
-        # Document knowledge
+    def _render_documents(self, query):
+        """Document knowledge: relevant excerpts if any match, otherwise just the names"""
         docs = self.list_documents()
-        if docs:
-            context_parts.append(f"\nKnown documents ({len(docs)}):")
+        excerpts = self.find_relevant_chunks(query)
+        lines = []
+        if excerpts:
+            lines.append("\nRelevant document excerpts:")
+            for excerpt in excerpts:
+                lines.append(f"[{excerpt['source']}] {excerpt['text']}")
+        elif docs and self.vector_index:
+            names = ", ".join(docs[:10])
+            lines.append(f"\nKnown documents ({len(docs)}): {names}")
+        elif docs:
+            lines.append(f"\nKnown documents ({len(docs)}):")
             for doc_name in docs[:5]:  # Show max 5
-                doc = self.get_document(doc_name)
+                doc = config.get_document(doc_name)  # Summary only, no body
                 if doc:
-                    context_parts.append(f"- {doc_name}: {doc.get('summary', 'No summary')[:100]}")
-        
-        return "\n".join(context_parts) if context_parts else ""
+                    lines.append(f"- {doc_name}: {doc.get('summary', 'No summary')[:100]}")
+        return "\n".join(lines)
 
 
 # Global memory instance
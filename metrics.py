@@ -0,0 +1,140 @@
+"""
+Anna AI Assistant - Request Metrics
+Per-request timing and token records, rolling percentiles and a report over the saved log
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from config import config
+from logger import logger
+
+
+TIMINGS = ("total_ms", "prompt_build_ms", "model_ms", "first_chunk_ms", "parse_ms")
+TOKENS = ("prompt_tokens", "cached_tokens", "output_tokens", "prompt_estimate")
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def elapsed_ms(since):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def summarize(records):
+    """Outcome counts, p50/p95/p99 per timing and average tokens per model call"""
+    model_records = [r for r in records if r.get("outcome") == "model"]
+    summary = {
+        "requests": len(records),
+        "outcomes": dict(Counter(r.get("outcome", "?") for r in records)),
+        "timings": {},
+        "tokens": {},
+    }
+    for field in TIMINGS:
+        values = [r[field] for r in records if r.get(field) is not None]
+        if values:
+            summary["timings"][field] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+    for field in TOKENS:
+        values = [r[field] for r in model_records if r.get(field) is not None]
+        if values:
+            summary["tokens"][field] = sum(values) / len(values)
+    return summary
+
+
+def format_report(summary):
+    """Plain-text report of a summary"""
+    lines = [f"Requests: {summary['requests']}"]
+    if summary["outcomes"]:
+        lines.append("Outcomes: " + ", ".join(
+            f"{outcome} {count} ({count / summary['requests']:.0%})"
+            for outcome, count in sorted(summary["outcomes"].items(), key=lambda item: -item[1])
+        ))
+    if summary["timings"]:
+        lines.append(f"{'timing':<16}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for field, values in summary["timings"].items():
+            lines.append(f"{field:<16}" + "".join(f"{values[p]:>10.1f}" for p in ("p50", "p95", "p99")))
+    if summary["tokens"]:
+        lines.append("Tokens per model call: " + ", ".join(
+            f"{field} {value:.0f}" for field, value in summary["tokens"].items()
+        ))
+    return "\n".join(lines)
+
+
+class RequestMetrics:
+    """Keeps the latest records in memory and appends every record to a JSONL file"""
+    
+    def __init__(self, path, window=500, enabled=True):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, entry):
+        """Store one request record (timings in milliseconds)"""
+        if not self.enabled:
+            return
+        entry = {"ts": round(time.time(), 3), **entry}
+        with self._lock:
+            self._recent.append(entry)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.log_error("REQUEST_METRICS", str(e), str(self.path))
+    
+    def summary(self):
+        """Rolling aggregates over the in-memory window"""
+        with self._lock:
+            records = list(self._recent)
+        return summarize(records)
+
+
+def load_records(path, last=None, outcome=None, since_hours=None):
+    """Records from a metrics file, optionally filtered"""
+    records = []
+    cutoff = time.time() - since_hours * 3600 if since_hours else None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if outcome and entry.get("outcome") != outcome:
+                continue
+            if cutoff and entry.get("ts", 0) < cutoff:
+                continue
+            records.append(entry)
+    return records[-last:] if last else records
+
+
+# Global request metrics instance
+request_metrics = RequestMetrics(logger.log_dir / "requests.jsonl", enabled=config.request_metrics)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report over Anna's per-request metrics")
+    parser.add_argument('--file', default=str(request_metrics.path), help="Metrics JSONL file")
+    parser.add_argument('--last', type=int, help="Only the newest N requests")
+    parser.add_argument('--since', type=float, help="Only requests from the last N hours")
+    parser.add_argument('--outcome', help="Only one outcome: model, fast_path, cache, fallback, ...")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    options = parser.parse_args()
+    
+    if not Path(options.file).exists():
+        print(f"No metrics recorded yet ({options.file})")
+    else:
+        summary = summarize(load_records(options.file, options.last, options.outcome, options.since))
+        print(json.dumps(summary, indent=2) if options.json else format_report(summary))
@@ -0,0 +1,99 @@
+"""
+Anna AI Assistant - Model Router
+Sends short commands to a fast, cheap model and document/reasoning requests to the full one
+"""
+
+import re
+import threading
+from collections import deque
+from config import config
+from logger import logger
+from metrics import percentile
+
+
+# Verbs that make a request a command to parse rather than a question to think about
+ACTION_PATTERN = re.compile(
+    r"\b(?:open|launch|start|run|play|close|search|google|look up|go to|type|press|click|"
+    r"volume|mute|brightness|wifi|shut ?down|restart|create|delete|read|write|find)\b"
+)
+# Wording that asks for reasoning over content
+REASONING_PATTERN = re.compile(
+    r"\b(?:why|explain|summari[sz]e|compare|analy[sz]e|difference|pros and cons|"
+    r"according to|what does .+ say|in detail|step by step|plan|draft|rewrite)\b"
+)
+DOCUMENT_PATTERN = re.compile(r"\b(?:document|pdf|report|notes|chapter|page \d+|the file|my file)\b")
+
+
+class ModelRouter:
+    """Pick a model tier per request from cheap local features
+
+    fast: short requests that are mostly commands or small talk
+    full: long inputs, document references and requests that need reasoning
+    """
+    
+    def __init__(self, fast_model, full_model, enabled=True, command_words=12, chat_words=8, window=200):
+        self.models = {"fast": fast_model, "full": full_model}
+        self.enabled = enabled
+        self.command_words = command_words
+        self.chat_words = chat_words
+        self.counts = {"fast": 0, "full": 0}
+        self._latency = {"fast": deque(maxlen=window), "full": deque(maxlen=window)}
+        self._lock = threading.Lock()
+    
+    def route(self, user_input):
+        """Returns {"tier", "model", "reason"} for a request"""
+        text = " ".join((user_input or "").lower().split())
+        words = len(text.split())
+        tier, reason = self._classify(text, words)
+        
+        with self._lock:
+            self.counts[tier] += 1
+        logger.log_debug(f"Model route: {tier} -> {self.models[tier]} ({reason}, {words} words)")
+        return {"tier": tier, "model": self.models[tier], "reason": reason}
+    
+    def _classify(self, text, words):
+        """(tier, reason) for normalized input"""
+        if not self.enabled:
+            return "full", "routing off"
+        if self._mentions_document(text):
+            return "full", "document reference"
+        if REASONING_PATTERN.search(text):
+            return "full", "reasoning"
+        if ACTION_PATTERN.search(text) and words <= self.command_words:
+            return "fast", "command"
+        if words <= self.chat_words:
+            return "fast", "short"
+        return "full", "long"
+    
+    def _mentions_document(self, text):
+        """Document wording, or the name of a learned document"""
+        if DOCUMENT_PATTERN.search(text):
+            return True
+        for name in config.settings.get("learned_documents", {}):
+            stem = name.lower().rsplit(".", 1)[0]
+            if len(stem) > 2 and stem in text:
+                return True
+        return False
+    
+    def record(self, route, seconds):
+        """Feed in how long the routed model call took"""
+        with self._lock:
+            self._latency[route["tier"]].append(seconds)
+        logger.log_debug(f"Model reply ({route['tier']} tier, {route['model']}): {seconds:.2f}s")
+    
+    def stats(self):
+        """Requests and p50/p95 latency per tier"""
+        with self._lock:
+            return {
+                tier: {
+                    "model": self.models[tier],
+                    "requests": self.counts[tier],
+                    "p50": percentile(list(self._latency[tier]), 50),
+                    "p95": percentile(list(self._latency[tier]), 95),
+                }
+                for tier in self.models
+            }
+
+
+# Global model router instance
+model_router = ModelRouter(config.model_fast, config.model_full, config.model_routing)
@@ -0,0 +1,72 @@
+"""
+Anna AI Assistant - Prompt Assembler
+Packs prompt sections by priority under a token budget
+"""
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class PromptAssembler:
+    """Fits context sections into a token budget, highest priority first"""
+    
+    def __init__(self, min_section_tokens=24):
+        # Below this, a truncated section is more noise than help, so drop it
+        self.min_section_tokens = min_section_tokens
+    
+    def pack(self, sections, budget):
+        """Pack sections into the budget
+
+        sections: [{"name", "text", "priority", "keep"}]; lower priority number wins,
+        keep is "head" (trim the end) or "tail" (trim the start, e.g. older turns).
+        Returns (text in original section order, report dict).
+        """
+        report = {"budget": budget, "tokens": 0, "sections": {}, "truncated": [], "dropped": []}
+        remaining = max(budget, 0)
+        packed = {}
+        
+        for section in sorted(sections, key=lambda s: s["priority"]):
+            text = section["text"]
+            if not text:
+                continue
+            tokens = estimate_tokens(text)
+            
+            if tokens > remaining:
+                if remaining < self.min_section_tokens:
+                    report["dropped"].append(section["name"])
+                    continue
+                text = self._truncate(text, remaining, section.get("keep", "head"))
+                tokens = estimate_tokens(text)
+                report["truncated"].append(section["name"])
+            
+            packed[section["name"]] = text
+            report["sections"][section["name"]] = tokens
+            remaining -= tokens
+        
+        report["tokens"] = sum(report["sections"].values())
+        text = "\n".join(packed[s["name"]] for s in sections if s["name"] in packed)
+        return text, report
+    
+    def _truncate(self, text, tokens, keep):
+        """Cut text to roughly `tokens`, preferring line boundaries"""
+        marker = "[...truncated]"
+        chars = max(tokens * 4 - len(marker) - 1, 0)
+        
+        if keep == "tail":
+            cut = text[-chars:] if chars else ""
+            newline = cut.find("\n")
+            if 0 <= newline < len(cut) // 2:
+                cut = cut[newline + 1:]
+            return f"{marker}\n{cut}"
+        
+        cut = text[:chars]
+        newline = cut.rfind("\n")
+        if newline > len(cut) // 2:
+            cut = cut[:newline]
+        return f"{cut}\n{marker}"
+
+
+# Global prompt assembler instance
+prompt_assembler = PromptAssembler()
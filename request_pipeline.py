@@ -0,0 +1,163 @@
+"""
+Anna AI Assistant - Request Pipeline
+Runs user requests one at a time, in order, on an asyncio loop with cancellation
+"""
+
+import asyncio
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger
+
+
+# "no, open firefox" / "actually, search bing" replace whatever is queued or running
+CORRECTION_PATTERN = re.compile(
+    r"^\s*(?:no\s*,|actually\b,?|wait\s*,|instead\s*,|scratch that\b[,.]?|cancel that\b[,.]?)\s*",
+    re.IGNORECASE
+)
+# Bare cancel commands drop everything without starting anything new
+CANCEL_PATTERN = re.compile(r"^\s*(?:cancel|never\s*mind|nevermind|stop that)\s*[.!]?\s*$", re.IGNORECASE)
+
+
+class PipelineRequest:
+    """One queued request; the handler checks is_cancelled() between stages"""
+    
+    def __init__(self, request_id, text):
+        self.id = request_id
+        self.text = text
+        self.submitted_at = time.time()
+        self.started_at = None
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """Ask the request to stop at its next checkpoint"""
+        self._cancelled.set()
+    
+    def is_cancelled(self):
+        """True once the request was superseded or cancelled"""
+        return self._cancelled.is_set()
+
+
+class RequestPipeline:
+    """Ordered request queue owned by an asyncio loop on a background thread
+
+    Requests are handled strictly one after another on a single worker thread, so
+    memory and PIN state never see two requests at once. A correction or cancel
+    command cancels queued requests (before they cost an API call) and flags the
+    running one; when max_pending requests are already waiting, new ones are refused.
+    """
+    
+    def __init__(self, handler, max_pending=8):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "rejected": 0, "failed": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._current = None
+        self._loop = asyncio.new_event_loop()
+        self._queue = None
+        self._ready = threading.Event()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anna-request")
+        self._thread = None
+    
+    def start(self):
+        """Start the event loop thread"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+    
+    def _run_loop(self):
+        """Thread body: own the event loop until stop()"""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._consume())
+    
+    async def _consume(self):
+        """Take requests off the queue in order and run them on the worker thread"""
+        self._queue = asyncio.Queue()
+        self._ready.set()
+        while True:
+            request = await self._queue.get()
+            if request is None:
+                break
+            
+            with self._lock:
+                self._waiting.remove(request)
+                if request.is_cancelled():
+                    self.stats["cancelled"] += 1
+                    logger.log_debug(f"Request {request.id} dropped before it started: {request.text[:50]}")
+                    continue
+                self._current = request
+            
+            request.started_at = time.time()
+            try:
+                await self._loop.run_in_executor(self._worker, self.handler, request)
+                with self._lock:
+                    self.stats["cancelled" if request.is_cancelled() else "completed"] += 1
+            except Exception as e:
+                with self._lock:
+                    self.stats["failed"] += 1
+                logger.log_error("PIPELINE_REQUEST", str(e), request.text)
+            finally:
+                with self._lock:
+                    self._current = None
+        
+        self._worker.shutdown(wait=False)
+    
+    def submit(self, text):
+        """Queue a request; returns ("queued", request), ("cancelled", count) or ("rejected", None)
+
+        Corrections cancel everything before them; the correction itself (prefix
+        removed) is queued. A bare cancel command only cancels.
+        """
+        if CANCEL_PATTERN.match(text):
+            return "cancelled", self.cancel_all()
+        
+        correction = CORRECTION_PATTERN.match(text)
+        if correction and text[correction.end():].strip():
+            cancelled = self.cancel_all()
+            logger.log_debug(f"Correction superseded {cancelled} request(s)")
+            text = text[correction.end():].strip()
+        
+        with self._lock:
+            if sum(not r.is_cancelled() for r in self._waiting) >= self.max_pending:
+                self.stats["rejected"] += 1
+                return "rejected", None
+            request = PipelineRequest(next(self._ids), text)
+            self._waiting.append(request)
+            self.stats["submitted"] += 1
+        
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, request)
+        return "queued", request
+    
+    def cancel_all(self):
+        """Cancel the running request and everything waiting; returns how many"""
+        with self._lock:
+            targets = [r for r in self._waiting if not r.is_cancelled()]
+            if self._current and not self._current.is_cancelled():
+                targets.append(self._current)
+            for request in targets:
+                request.cancel()
+        return len(targets)
+    
+    def pending(self):
+        """Number of requests waiting to start"""
+        with self._lock:
+            return len(self._waiting)
+    
+    def get_stats(self):
+        """Counters plus current queue depth"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._waiting)
+            stats["running"] = self._current.text if self._current else None
+        return stats
+    
+    def stop(self):
+        """Finish the current request and stop the loop"""
+        if self._thread:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
@@ -0,0 +1,269 @@
+"""
+Anna AI Assistant - Resilient Model Calls
+Deadlines, jittered retries and a circuit breaker around the LLM backend
+"""
+
+import random
+import threading
+import time
+import urllib.error
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import config
+from logger import logger
+from llm_backend import llm
+from metrics import percentile
+
+
+# google.api_core exception names worth another attempt (matched by name, so the
+# SDK doesn't have to be importable for the other backends)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted",
+}
+RETRYABLE_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """The model gave no answer: deadline spent, retries exhausted or circuit open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after the cooldown one probe call is let through"""
+    
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+    
+    def record_success(self):
+        """The service answered: close the circuit"""
+        with self._lock:
+            if self.state != "closed":
+                logger.log_debug("Model circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+    
+    def record_failure(self):
+        """A call failed; open the circuit at the threshold or when a probe fails"""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    logger.log_error("LLM_CIRCUIT", f"Opened after {self.failures} failure(s)",
+                                     f"Failing fast for {self.cooldown:.0f}s")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+    
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 when closed)"""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(self.cooldown - (time.monotonic() - self._opened_at), 0.0)
+
+
+class ResilientLLM:
+    """Same generate() interface as the backends, with a deadline per call
+
+    Each attempt runs on a worker thread and is abandoned after `timeout` seconds, so a
+    hung API cannot hold the request thread. An abandoned attempt keeps its worker
+    until the backend returns; at most `max_workers` attempts are in flight, and once
+    hung calls hold them all, new attempts fail after waiting their timeout for a
+    free worker instead of queueing behind the hung ones. Transient errors are retried with full
+    jitter exponential backoff while the call's deadline allows it. Failures feed a
+    circuit breaker; while it is open, calls raise LLMUnavailableError immediately so
+    callers can fall back to local handling.
+    """
+    
+    def __init__(self, backend, timeout=15.0, deadline=30.0, retries=2,
+                 backoff_base=0.5, backoff_max=4.0, breaker=None, max_workers=8, window=500):
+        self.backend = backend
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.counters = {"calls": 0, "failed": 0, "retries": 0, "timeouts": 0, "short_circuited": 0}
+        self._latency = deque(maxlen=window)       # whole calls, retries included
+        self._first_chunk = deque(maxlen=window)   # streamed calls, until the first chunk
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        # One slot per worker thread, held until the attempt really ends (abandoned or not)
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="anna-llm")
+    
+    @property
+    def name(self):
+        return self.backend.name
+    
+    @property
+    def available(self):
+        return self.backend.available
+    
+    def list_models(self):
+        """Models the wrapped backend can serve"""
+        return self.backend.list_models()
+    
+    def generate(self, prompt, system_instruction=None, stream=False, model=None, deadline=None):
+        """backend.generate() within `deadline` seconds (default: LLM_DEADLINE)
+
+        Streamed calls are retried only until the first chunk arrives; after that a
+        stall longer than `timeout` between chunks ends the stream with an error.
+        """
+        expires = time.monotonic() + (deadline or self.deadline)
+        self._count("calls")
+        if stream:
+            return self._stream(prompt, system_instruction, model, expires)
+        call = lambda: self.backend.generate(prompt, system_instruction, model=model)
+        return self._call(call, expires, self._latency)
+    
+    def _stream(self, prompt, system_instruction, model, expires):
+        """Generator over the chunks of a streamed call"""
+        def first():
+            chunks = iter(self.backend.generate(prompt, system_instruction, stream=True, model=model))
+            return chunks, next(chunks, None)
+        
+        chunks, chunk = self._call(first, expires, self._first_chunk)
+        while chunk is not None:
+            yield chunk
+            future = self._submit(lambda: next(chunks, None), self.timeout)
+            try:
+                if future is None:
+                    raise FutureTimeout()
+                chunk = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                self._count("timeouts")
+                self.breaker.record_failure()
+                self._fail(f"stream stalled for {self.timeout:.0f}s")
+            except Exception as e:
+                if self._retryable(e):
+                    self.breaker.record_failure()
+                self._fail(f"stream broke off: {e}", e)
+    
+    def _call(self, call, expires, latencies):
+        """Run call() with per-attempt timeouts and backoff until it succeeds or time runs out"""
+        started = time.monotonic()
+        attempt = 0
+        error = None
+        while True:
+            if not self.breaker.allow():
+                if error:
+                    # Our own failures just opened the circuit
+                    self._fail(f"model call failed after {attempt} attempt(s): {error}", error)
+                self._count("short_circuited")
+                self._fail(f"model circuit open, next try in {self.breaker.retry_in():.0f}s", count=False)
+            
+            remaining = expires - time.monotonic()
+            attempt_timeout = max(min(self.timeout, remaining), 0.0)
+            attempt_expires = time.monotonic() + attempt_timeout
+            future = self._submit(call, attempt_timeout)
+            try:
+                if future is None:
+                    raise FutureTimeout(f"no free model worker within {attempt_timeout:.1f}s "
+                                        f"({self.max_workers} held by unfinished calls)")
+                result = future.result(timeout=max(attempt_expires - time.monotonic(), 0.0))
+            except FutureTimeout as e:
+                if future is not None:
+                    future.cancel()
+                self._count("timeouts")
+                error = TimeoutError(str(e) or f"no reply within {attempt_timeout:.1f}s")
+            except Exception as e:
+                if not self._retryable(e):
+                    # The service answered, just not usefully (bad request, blocked prompt...)
+                    self.breaker.record_success()
+                    raise
+                error = e
+            else:
+                self.breaker.record_success()
+                with self._lock:
+                    latencies.append(time.monotonic() - started)
+                return result
+            
+            self.breaker.record_failure()
+            attempt += 1
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if attempt > self.retries or time.monotonic() + delay >= expires:
+                self._fail(f"model call failed after {attempt} attempt(s): {error}", error)
+            
+            self._count("retries")
+            logger.log_debug(f"Model call attempt {attempt} failed ({error}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+    
+    def _submit(self, fn, timeout):
+        """Run fn() on the pool once a worker slot is free; None if none frees up in time"""
+        if not self._slots.acquire(timeout=timeout):
+            return None
+        
+        def run():
+            try:
+                return fn()
+            finally:
+                self._slots.release()
+        
+        return self._executor.submit(run)
+    
+    def _retryable(self, error):
+        """Timeouts, connection problems, rate limits and 5xx responses"""
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in RETRYABLE_HTTP_CODES
+        if isinstance(error, (TimeoutError, ConnectionError, urllib.error.URLError)):
+            return True
+        return type(error).__name__ in RETRYABLE_ERRORS
+    
+    def _fail(self, message, cause=None, count=True):
+        """Raise LLMUnavailableError (logged and counted as a failed call unless count=False)"""
+        if count:
+            self._count("failed")
+            logger.log_error("LLM_CALL", message)
+        else:
+            logger.log_debug(f"Model call skipped: {message}")
+        raise LLMUnavailableError(message) from cause
+    
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+    
+    def stats(self):
+        """Counters, breaker state and p50/p95/p99 latency in seconds"""
+        with self._lock:
+            stats = dict(self.counters)
+            latency = list(self._latency)
+            first_chunk = list(self._first_chunk)
+        stats["breaker"] = self.breaker.state
+        stats["trips"] = self.breaker.trips
+        for label, values in (("latency", latency), ("first_chunk", first_chunk)):
+            stats[label] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+        return stats
+
+
+# Global resilient model client
+resilient_llm = ResilientLLM(
+    llm,
+    timeout=config.llm_timeout,
+    deadline=config.llm_deadline,
+    retries=config.llm_retries,
+    breaker=CircuitBreaker(config.llm_breaker_failures, config.llm_breaker_cooldown)
+)
@@ -0,0 +1,149 @@
+"""
+Anna AI Assistant - Response Cache
+Bounded LRU cache of model replies with per-action expiry
+"""
+
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from storage import atomic_write_json
+from config import config
+from logger import logger
+
+
+# Seconds a cached reply stays valid, per action type
+ACTION_TTLS = {
+    # Conversation is also keyed on the last few exchanges (see AnnaBrain._answer_locally)
+    "none": 1800,
+    "open_app": 7 * 24 * 3600,
+    "launch_game": 7 * 24 * 3600,
+    "open_url": 7 * 24 * 3600,
+    "web_search": 24 * 3600,
+    "system_control": 24 * 3600,
+    "open_folder": 3600,
+    "open_file": 3600,
+    "read_file": 600,
+    "search_files": 600,
+}
+
+# Actions whose effect depends on the moment (or that can do damage) are never replayed;
+# anything not listed in ACTION_TTLS is skipped as well
+UNCACHEABLE_ACTIONS = {
+    "run_cmd", "write_file", "type_text", "press_key", "click", "move_mouse", "dangerous_action",
+}
+
+
+class ResponseCache:
+    """LRU over {normalized input + context fingerprint -> brain result}"""
+    
+    def __init__(self, path, capacity=256):
+        self.path = Path(path)
+        self.capacity = capacity
+        self._entries = OrderedDict()  # key -> {"expires", "response", "actions"}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.stats_counts = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0,
+                             "evicted": 0, "expired": 0}
+        self._load()
+        atexit.register(self.save)
+    
+    def make_key(self, normalized_input, fingerprint):
+        """Cache key for an input under a given context"""
+        return hashlib.sha1(f"{fingerprint}\x00{normalized_input}".encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        """Cached {"response", "actions"} or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats_counts["misses"] += 1
+                return None
+            if entry["expires"] <= now:
+                del self._entries[key]
+                self._dirty = True
+                self.stats_counts["expired"] += 1
+                self.stats_counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats_counts["hits"] += 1
+            return {"response": entry["response"], "actions": entry["actions"]}
+    
+    def ttl_for(self, actions):
+        """Lifetime for a result (shortest of its actions), or None if it must not be cached"""
+        ttls = []
+        for action in [a.get("action", "none") for a in actions] or ["none"]:
+            if action in UNCACHEABLE_ACTIONS or action not in ACTION_TTLS:
+                return None
+            ttls.append(ACTION_TTLS[action])
+        return min(ttls)
+    
+    def put(self, key, response, actions):
+        """Store a result if all of its actions are cacheable; returns True when stored"""
+        ttl = self.ttl_for(actions)
+        with self._lock:
+            if ttl is None:
+                self.stats_counts["skipped"] += 1
+                return False
+            self._entries[key] = {"expires": time.time() + ttl, "response": response, "actions": actions}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.stats_counts["evicted"] += 1
+            self.stats_counts["stores"] += 1
+            self._dirty = True
+        return True
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.save()
+    
+    def stats(self):
+        """Counters plus current size"""
+        with self._lock:
+            stats = dict(self.stats_counts)
+            stats["size"] = len(self._entries)
+            stats["capacity"] = self.capacity
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+    
+    def _load(self):
+        """Read surviving entries back, oldest first so LRU order is kept"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            now = time.time()
+            for key, entry in entries:
+                if entry.get("expires", 0) > now and "actions" in entry:
+                    self._entries[key] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        except Exception as e:
+            logger.log_error("RESPONSE_CACHE_LOAD", str(e), str(self.path))
+            self._entries.clear()
+    
+    def save(self):
+        """Persist the cache if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._entries.items())
+            self._dirty = False
+        try:
+            atomic_write_json(self.path, entries)
+        except Exception as e:
+            logger.log_error("RESPONSE_CACHE_SAVE", str(e), str(self.path))
+
+
+# Global response cache instance
+response_cache = ResponseCache(config.config_dir / "response_cache.json", config.response_cache_size)
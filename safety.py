@@ -4,6 +4,9 @@ Security controls and dangerous action detection
 """
 
 import re
+import secrets
+import threading
+import time
 from logger import logger
 from config import config
 
@@ -32,6 +35,11 @@ class Safety:
         self.pending_dangerous_action = None
         self.pin_attempts = 0
         self.max_pin_attempts = 3
+        
+        # One-time grants for PINs entered while the model was still answering
+        self.grant_ttl = 120
+        self._grants = {}
+        self._grant_lock = threading.Lock()
     
     def is_dangerous(self, user_input, action_type=None):
         """Check if input or action is dangerous"""
@@ -68,6 +76,34 @@ class Safety:
             
             return False
     
+    def issue_grant(self, user_input):
+        """One-time token for a PIN verified before the model replied, bound to this input"""
+        token = secrets.token_urlsafe(16)
+        with self._grant_lock:
+            self._grants[token] = {"input": user_input, "expires": time.time() + self.grant_ttl}
+        logger.log_audit("PIN_PREAUTHORIZED", user_input, "Grant issued", True)
+        return token
+    
+    def redeem_grant(self, token, user_input, action_data):
+        """Spend a grant on the action that came back
+
+        Only for an action that still requires the PIN on its own check; False when the
+        grant is unknown, already used, expired or was issued for a different input.
+        """
+        if not self.requires_pin(user_input, action_data.get("action")):
+            return False
+        with self._grant_lock:
+            grant = self._grants.pop(token, None)
+        if not grant or grant["input"] != user_input or grant["expires"] < time.time():
+            return False
+        logger.log_audit("PIN_GRANT_USED", user_input, str(action_data), True)
+        return True
+    
+    def revoke_grant(self, token):
+        """Drop a grant that no action used"""
+        with self._grant_lock:
+            self._grants.pop(token, None)
+    
     def request_pin_confirmation(self, user_input, action_data):
         """Store pending action and request PIN"""
         self.pending_dangerous_action = {
@@ -0,0 +1,129 @@
+"""
+Anna AI Assistant - Search Index
+Persistent inverted index over learned documents with BM25 ranking
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into (term, char offset) pairs"""
+    return [(match.group().lower(), match.start()) for match in TOKEN_PATTERN.finditer(text or "")]
+
+
+class SearchIndex:
+    """Inverted index stored in SQLite, updated one document at a time"""
+    
+    def __init__(self, db_path, k1=1.2, b=0.75):
+        self.db_path = Path(db_path)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (name TEXT PRIMARY KEY, length INTEGER NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, name TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "first_pos INTEGER NOT NULL, PRIMARY KEY (term, name)) WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS postings_name ON postings (name)")
+            # Document lengths stay in memory for BM25 length normalization
+            self.doc_lengths = dict(self.conn.execute("SELECT name, length FROM docs").fetchall())
+        self.total_length = sum(self.doc_lengths.values())
+    
+    def __contains__(self, name):
+        return name in self.doc_lengths
+    
+    def __len__(self):
+        return len(self.doc_lengths)
+    
+    def add(self, name, content, summary=""):
+        """Index (or re-index) one document"""
+        terms = Counter()
+        first_pos = {}
+        # Summary terms count for ranking but have no offset into the content
+        for term, _ in tokenize(summary):
+            terms[term] += 1
+            first_pos.setdefault(term, -1)
+        for term, pos in tokenize(content):
+            terms[term] += 1
+            if first_pos.get(term, -1) < 0:
+                first_pos[term] = pos
+        
+        length = sum(terms.values())
+        with self._lock, self.conn:
+            self._remove_locked(name)
+            self.conn.execute("INSERT INTO docs (name, length) VALUES (?, ?)", (name, length))
+            self.conn.executemany(
+                "INSERT INTO postings (term, name, tf, first_pos) VALUES (?, ?, ?, ?)",
+                [(term, name, tf, first_pos[term]) for term, tf in terms.items()]
+            )
+            self.doc_lengths[name] = length
+            self.total_length += length
+    
+    def remove(self, name):
+        """Drop a document from the index"""
+        with self._lock, self.conn:
+            self._remove_locked(name)
+    
+    def _remove_locked(self, name):
+        """Delete a document's rows (lock and transaction held)"""
+        if name not in self.doc_lengths:
+            return
+        self.conn.execute("DELETE FROM postings WHERE name = ?", (name,))
+        self.conn.execute("DELETE FROM docs WHERE name = ?", (name,))
+        self.total_length -= self.doc_lengths.pop(name)
+    
+    def search(self, query, limit=10):
+        """BM25-ranked hits: [{"filename", "score", "offset"}], best first"""
+        query_terms = list(dict.fromkeys(term for term, _ in tokenize(query)))
+        doc_count = len(self.doc_lengths)
+        if not query_terms or not doc_count:
+            return []
+        
+        avg_length = self.total_length / doc_count or 1
+        scores = Counter()
+        offsets = {}  # name -> (idf, offset) of the rarest matching term with a content position
+        
+        with self._lock:
+            postings = [
+                self.conn.execute(
+                    "SELECT name, tf, first_pos FROM postings WHERE term = ?", (term,)
+                ).fetchall()
+                for term in query_terms
+            ]
+        
+        for rows in postings:
+            if not rows:
+                continue
+            df = len(rows)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for name, tf, pos in rows:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths.get(name, 0) / avg_length)
+                scores[name] += idf * tf * (self.k1 + 1) / (tf + norm)
+                if pos >= 0 and idf > offsets.get(name, (-1, -1))[0]:
+                    offsets[name] = (idf, pos)
+        
+        return [
+            {"filename": name, "score": round(score, 4), "offset": offsets.get(name, (0, -1))[1]}
+            for name, score in scores.most_common(limit)
+        ]
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,128 @@
+"""
+Anna AI Assistant - Session Summarizer
+Folds older conversation turns into a running session summary in the background
+"""
+
+import threading
+from collections import deque
+from logger import logger
+from resilience import resilient_llm
+
+
+class SessionSummarizer:
+    """Keeps a fixed-size digest of everything older than the recent-turn window"""
+    
+    def __init__(self, window=3, batch=6, max_summary_chars=1200):
+        # Turns inside the window are sent verbatim; older ones get folded in batches
+        self.window = window
+        self.batch = batch
+        self.max_summary_chars = max_summary_chars
+        
+        self.model = resilient_llm if resilient_llm.available else None
+        
+        self.summary = ""
+        self.folded_turns = 0
+        self.version = 0  # bumped whenever get_summary() would change (context cache key)
+        self._epoch = 0   # bumped only by reset()
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._work = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def add_turn(self, user_input, anna_response, action=None):
+        """Queue a finished turn; wake the compactor once a batch has left the window"""
+        with self._lock:
+            self._pending.append((user_input, anna_response, action))
+            if len(self._pending) > self.window:
+                self.version += 1  # A turn left the window and now shows in the digest
+            if len(self._pending) >= self.window + self.batch:
+                self._work.set()
+    
+    def reset(self):
+        """Forget the session summary"""
+        with self._lock:
+            self._pending.clear()
+            self.summary = ""
+            self.folded_turns = 0
+            self.version += 1
+            self._epoch += 1
+    
+    def get_summary(self):
+        """Digest of everything before the recent-turn window"""
+        with self._lock:
+            # Turns that left the window but are not folded yet are listed as-is
+            unfolded = list(self._pending)[:max(len(self._pending) - self.window, 0)]
+            lines = [self.summary] if self.summary else []
+            lines += [self._turn_line(*turn) for turn in unfolded]
+            total = self.folded_turns + len(unfolded)
+        if not lines:
+            return ""
+        return f"Earlier in this session ({total} turns):\n" + "\n".join(lines)
+    
+    def _turn_line(self, user_input, anna_response, action=None):
+        """One-line digest of a turn"""
+        line = f"- User: {user_input[:120]} | Anna: {anna_response[:120]}"
+        if action:
+            line += f" [{action}]"
+        return line
+    
+    def _run(self):
+        """Background loop: fold batches off the request path"""
+        while True:
+            self._work.wait()
+            self._work.clear()
+            try:
+                while self._fold_once():
+                    pass
+            except Exception as e:
+                logger.log_error("SESSION_SUMMARY", str(e))
+    
+    def _fold_once(self):
+        """Fold the oldest batch of turns into the summary; False if nothing to do"""
+        with self._lock:
+            if len(self._pending) < self.window + self.batch:
+                return False
+            # Left in _pending until the fold lands, so they stay in the digest meanwhile
+            turns = list(self._pending)[:self.batch]
+            previous = self.summary
+            epoch = self._epoch
+        
+        summary = self._summarize(previous, turns)
+        
+        with self._lock:
+            if epoch != self._epoch:
+                return True  # Session was reset while we were summarizing
+            # Only this thread removes from the front, and new turns go on the back
+            for _ in turns:
+                self._pending.popleft()
+            self.summary = summary
+            self.folded_turns += len(turns)
+            self.version += 1
+        return True
+    
+    def _summarize(self, previous, turns):
+        """Merge turns into the previous summary, bounded to max_summary_chars"""
+        lines = [self._turn_line(*turn) for turn in turns]
+        
+        if self.model:
+            new_turns = "\n".join(lines)
+            try:
+                prompt = f"""Update this running summary of a conversation between a user and Anna.
+Keep names, files, apps, preferences and open questions; drop small talk.
+Answer with the updated summary only, under {self.max_summary_chars // 6} words.
+
+Current summary:
+{previous or "(none)"}
+
+New turns:
+{new_turns}"""
+                response = self.model.generate(prompt)
+                return response.text.strip()[:self.max_summary_chars]
+            except Exception as e:
+                logger.log_error("SESSION_SUMMARY", str(e), "Falling back to local summary")
+        
+        # Local fallback: keep the newest turn lines that fit
+        merged = (previous.split("\n") if previous else []) + lines
+        while merged and len("\n".join(merged)) > self.max_summary_chars:
+            merged.pop(0)
+        return "\n".join(merged)
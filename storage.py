@@ -0,0 +1,190 @@
+"""
+Anna AI Assistant - Storage Backends
+Persistence engines behind Config: SQLite (WAL, row-level writes) and legacy JSON
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from logger import logger
+
+
+# Top-level settings stored as key/value rows (everything else has its own table)
+SCALAR_SETTINGS = ["pin_hash", "first_run", "preferences"]
+
+
+def atomic_write_json(path, data, indent=None):
+    """Write JSON to a temp file, fsync it, then rename over the target"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JSONStorage:
+    """Legacy storage: the whole settings dict in one JSON file"""
+    
+    def __init__(self, path):
+        self.path = Path(path)
+    
+    def load(self):
+        """Load settings, or None if the file does not exist"""
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return None
+    
+    def write(self, settings, changes):
+        """Persist changes (JSON has no row-level writes, so rewrite everything)"""
+        atomic_write_json(self.path, settings, indent=2)
+    
+    def clear_history(self, settings):
+        """Drop the legacy history list"""
+        atomic_write_json(self.path, settings, indent=2)
+    
+    def close(self):
+        """Nothing to release for file storage"""
+        pass
+
+
+class SQLiteStorage:
+    """SQLite storage in WAL mode with one table per settings section"""
+    
+    # Table name -> (key column, value column)
+    TABLES = {
+        "settings": ("key", "value"),
+        "apps": ("name", "path"),
+        "games": ("name", "path"),
+        "documents": ("name", "data"),
+        "context": ("key", "value"),
+    }
+    
+    def __init__(self, path, history_limit=50):
+        self.path = Path(path)
+        self.history_limit = history_limit
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+    
+    def _create_tables(self):
+        """Create tables if they don't exist"""
+        with self._lock, self.conn:
+            for table, (key_col, value_col) in self.TABLES.items():
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    f"({key_col} TEXT PRIMARY KEY, {value_col} TEXT NOT NULL)"
+                )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS history "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)"
+            )
+    
+    def is_empty(self):
+        """Check if nothing has been stored yet"""
+        with self._lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM settings").fetchone()
+        return row[0] == 0
+    
+    def load(self):
+        """Load settings into the legacy dict layout, or None if empty"""
+        if self.is_empty():
+            return None
+        
+        with self._lock:
+            rows = self._rows
+            settings = {key: json.loads(value) for key, value in rows("settings")}
+            settings["learned_apps"] = dict(rows("apps"))
+            settings["learned_games"] = dict(rows("games"))
+            settings["learned_documents"] = {
+                name: json.loads(data) for name, data in rows("documents")
+            }
+            history = self.conn.execute("SELECT data FROM history ORDER BY id").fetchall()
+            settings["memory"] = {
+                "conversation_history": [json.loads(data) for (data,) in history],
+                "user_context": {key: json.loads(value) for key, value in rows("context")},
+            }
+        return settings
+    
+    def _rows(self, table):
+        """Fetch all key/value rows of a table"""
+        key_col, value_col = self.TABLES[table]
+        return self.conn.execute(f"SELECT {key_col}, {value_col} FROM {table}").fetchall()
+    
+    def import_settings(self, settings):
+        """Write a full legacy settings dict (used for first run and JSON migration)"""
+        changes = [("settings", key, settings[key]) for key in SCALAR_SETTINGS if key in settings]
+        changes += [("apps", k, v) for k, v in settings.get("learned_apps", {}).items()]
+        changes += [("games", k, v) for k, v in settings.get("learned_games", {}).items()]
+        changes += [("documents", k, v) for k, v in settings.get("learned_documents", {}).items()]
+        mem = settings.get("memory", {})
+        changes += [("context", k, v) for k, v in mem.get("user_context", {}).items()]
+        changes += [("history", None, entry) for entry in mem.get("conversation_history", [])]
+        self.write(settings, changes)
+    
+    def write(self, settings, changes):
+        """Apply row-level changes in a single transaction"""
+        trim_history = False
+        with self._lock, self.conn:
+            for table, key, value in changes:
+                if table == "history":
+                    self.conn.execute("INSERT INTO history (data) VALUES (?)", (json.dumps(value),))
+                    trim_history = True
+                    continue
+                
+                key_col, value_col = self.TABLES[table]
+                if table in ("apps", "games"):
+                    stored = value
+                else:
+                    stored = json.dumps(value)
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO {table} ({key_col}, {value_col}) VALUES (?, ?)",
+                    (key, stored)
+                )
+            
+            if trim_history:
+                self.conn.execute(
+                    "DELETE FROM history WHERE id NOT IN "
+                    "(SELECT id FROM history ORDER BY id DESC LIMIT ?)",
+                    (self.history_limit,)
+                )
+    
+    def clear_history(self, settings):
+        """Drop the legacy history rows"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM history")
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+
+def open_storage(backend, config_dir, history_limit=50):
+    """Open the configured storage backend, migrating legacy JSON into SQLite once"""
+    config_dir = Path(config_dir)
+    json_file = config_dir / "anna_config.json"
+    
+    if backend == "json":
+        return JSONStorage(json_file)
+    
+    storage = SQLiteStorage(config_dir / "anna_config.db", history_limit)
+    if storage.is_empty() and json_file.exists():
+        try:
+            storage.import_settings(JSONStorage(json_file).load())
+            logger.log_action("migrate_config", str(json_file), True, "Imported into SQLite")
+        except Exception as e:
+            logger.log_error("CONFIG_MIGRATE", str(e), str(json_file))
+    return storage
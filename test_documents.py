@@ -0,0 +1,59 @@
+"""Checks for re-learning documents whose content changed"""
+import os
+import sys
+import tempfile
+
+# Run in a scratch directory so config/, logs/ and the blob store are throwaway
+os.chdir(tempfile.mkdtemp(prefix="anna_test_"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["LLM_BACKEND"] = "replay"
+
+from pathlib import Path  # noqa: E402
+from config import config  # noqa: E402
+from memory import memory  # noqa: E402
+from document_processor import document_processor  # noqa: E402
+
+
+def learn(path):
+    result = document_processor.process_file(str(path))
+    if result["success"] and not result.get("duplicate"):
+        memory.add_document(result["data"])
+    return result
+
+
+def test_relearned_document_drops_old_hash():
+    docs = Path("docs")
+    docs.mkdir(exist_ok=True)
+    original = "Quarterly plan: ship the beta in March.\n"
+    (docs / "v1.txt").write_text(original, encoding="utf-8")
+    assert not learn(docs / "v1.txt").get("duplicate")
+    
+    # Edit and re-learn under the same name
+    (docs / "v1.txt").write_text("Quarterly plan: ship the beta in May.\n", encoding="utf-8")
+    os.utime(docs / "v1.txt", (1, 1))
+    assert not learn(docs / "v1.txt").get("duplicate")
+    assert "May" in config.get_document_content("v1.txt")
+    
+    # A backup of the original is new content now, not "Already learned v1.txt"
+    (docs / "v1_backup.txt").write_text(original, encoding="utf-8")
+    result = learn(docs / "v1_backup.txt")
+    assert not result.get("duplicate"), result["message"]
+    assert config.find_document_by_hash(result["data"]["file_hash"]) == "v1_backup.txt"
+
+
+def test_unsupported_type_is_not_hashed():
+    Path("image.png").write_bytes(b"\x89PNG")
+    hashed = []
+    original = document_processor._hash_file
+    document_processor._hash_file = lambda path: hashed.append(path)
+    try:
+        result = document_processor.process_file("image.png")
+    finally:
+        document_processor._hash_file = original
+    assert not result["success"] and not hashed
+
+
+if __name__ == "__main__":
+    test_relearned_document_drops_old_hash()
+    test_unsupported_type_is_not_hashed()
+    print("OK: re-learned documents are indexed by their current content")
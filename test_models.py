@@ -1,18 +1,19 @@
-"""Quick test to verify Gemini model"""
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+"""Quick test to verify the configured model backend (LLM_BACKEND)"""
+import time
+from llm_backend import llm
+from config import config
 
-load_dotenv()
+print(f"Backend: {llm.name}")
+print(f"API Key found: {bool(config.gemini_api_key)}")
+print(f"Available: {llm.available}")
 
-api_key = os.getenv("GEMINI_API_KEY")
-print(f"API Key found: {bool(api_key)}")
-
-if api_key:
-    genai.configure(api_key=api_key)
-    
+if llm.available:
     # List available models
     print("\nAvailable models:")
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"  - {m.name}")
+    for name in llm.list_models():
+        print(f"  - {name}")
+    
+    # One timed round trip
+    start = time.perf_counter()
+    response = llm.generate("Reply with one short friendly sentence.")
+    print(f"\nReply in {time.perf_counter() - start:.2f}s: {response.text.strip()[:200]}")
@@ -0,0 +1,70 @@
+"""Checks for multi-step plans whose steps carry a malformed "depends_on" """
+from action_parser import normalize_deps
+from automation_engine import automation_engine
+from anna_brain import anna_brain
+
+
+def test_normalize_deps():
+    assert normalize_deps({"depends_on": [0, 1]}, 2) == [0, 1]
+    assert normalize_deps({"depends_on": 1}, 2) == [1]
+    assert normalize_deps({"depends_on": "0"}, 2) == []
+    assert normalize_deps({"depends_on": [0, 2, -1, "1", True, None]}, 2) == [0]
+    assert normalize_deps({"depends_on": 3}, 1) == []
+    assert normalize_deps({}, 3) == []
+
+
+def test_plan_with_scalar_and_invalid_depends_on():
+    executed = []
+    
+    def execute(step):
+        executed.append(step["action"])
+        return {"success": step["action"] != "open_app", "message": ""}
+    
+    plan = [
+        {"action": "open_app", "target": "notepad"},
+        {"action": "web_search", "query": "news", "depends_on": 0},
+        {"action": "open_url", "url": "https://example.com", "depends_on": {"step": 0}},
+        {"action": "open_folder", "target": "downloads", "depends_on": [7]},
+    ]
+    original = automation_engine.execute
+    automation_engine.execute = execute
+    try:
+        result = automation_engine.execute_plan(plan)
+    finally:
+        automation_engine.execute = original
+    
+    statuses = [step["status"] for step in result["steps"]]
+    assert statuses == ["failed", "blocked", "done", "done"], statuses
+    assert "web_search" not in executed
+
+
+def test_batch_renumbers_scalar_depends_on():
+    replies = {
+        "open chrome": [{"action": "open_app", "target": "chrome"}],
+        "open notepad and type hi": [
+            {"action": "open_app", "target": "notepad"},
+            {"action": "type_text", "text": "hi", "depends_on": 0},
+            {"action": "press_key", "key": "enter", "depends_on": [5]},
+        ],
+    }
+    
+    def process(text, snapshot=None):
+        actions = replies[text]
+        return {"response": "", "action": actions[0], "actions": actions,
+                "needs_pin": False, "action_pins": [False] * len(actions)}
+    
+    original = anna_brain.process
+    anna_brain.process = process
+    try:
+        batch = anna_brain.process_batch(list(replies), max_workers=2)
+    finally:
+        anna_brain.process = original
+    
+    assert [step.get("depends_on") for step in batch["plan"]] == [None, None, [1], []]
+
+
+if __name__ == "__main__":
+    test_normalize_deps()
+    test_plan_with_scalar_and_invalid_depends_on()
+    test_batch_renumbers_scalar_depends_on()
+    print("OK: malformed depends_on handled")
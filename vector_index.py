@@ -0,0 +1,144 @@
+"""
+Anna AI Assistant - Vector Index
+Offline document chunk retrieval with hashed n-gram vectors (NumPy)
+"""
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+import hashlib
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+from logger import logger
+
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class VectorIndex:
+    """Chunk vectors kept per document, searched by cosine similarity
+
+    Each document's float16 matrix is saved to its own file in `path`, so adding a
+    document writes only that document. The matrix searched is stacked in memory
+    from the per-document ones when something changed.
+    """
+    
+    def __init__(self, path, dimensions=2048, chunk_chars=500, chunk_overlap=100):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dimensions = dimensions
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self._lock = threading.Lock()
+        
+        # Document name -> (matrix, [(start, end)] offsets of its chunks into the content)
+        self._documents = {}
+        self._names = set()
+        # Row i of the stacked matrix is chunk i: (document name, start, end)
+        self.matrix = np.zeros((0, dimensions), dtype=np.float16)
+        self.chunks = []
+        self._stale = False
+        self._load()
+    
+    def _load(self):
+        """Load every saved document matrix"""
+        for file in self.path.glob("*.npz"):
+            try:
+                with np.load(file, allow_pickle=False) as data:
+                    if data["matrix"].shape[1] != self.dimensions:
+                        continue
+                    spans = [(int(start), int(end)) for start, end in zip(data["starts"], data["ends"])]
+                    self._documents[str(data["name"])] = (data["matrix"], spans)
+            except Exception as e:
+                logger.log_error("VECTOR_LOAD", str(e), str(file))
+        self._names = set(self._documents)
+        self._stale = True
+    
+    def _file_for(self, name):
+        return self.path / f"{hashlib.sha1(name.encode('utf-8')).hexdigest()[:20]}.npz"
+    
+    def _save(self, name, matrix, spans):
+        """Persist one document's matrix and chunk offsets"""
+        tmp_path = self.path / f"{self._file_for(name).stem}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            name=np.array(name),
+            matrix=matrix,
+            starts=np.array([span[0] for span in spans], dtype=np.int64),
+            ends=np.array([span[1] for span in spans], dtype=np.int64)
+        )
+        os.replace(tmp_path, self._file_for(name))
+    
+    def __contains__(self, name):
+        return name in self._names
+    
+    def embed(self, text):
+        """Hashed word and character-trigram counts, log-scaled and L2-normalized"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % self.dimensions] += 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode('utf-8')) % self.dimensions] += 0.5
+        
+        np.log1p(vector, out=vector)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def chunk_text(self, text):
+        """Overlapping (start, end) windows over the text"""
+        step = max(self.chunk_chars - self.chunk_overlap, 1)
+        return [
+            (start, min(start + self.chunk_chars, len(text)))
+            for start in range(0, max(len(text) - self.chunk_overlap, 1), step)
+        ]
+    
+    def add(self, name, content, chunks=None):
+        """Embed a document's chunks, replacing any previous vectors for it"""
+        if chunks is None:
+            chunks = self.chunk_text(content)
+        chunks = [(start, end) for start, end in chunks if content[start:end].strip()]
+        matrix = np.zeros((len(chunks), self.dimensions), dtype=np.float16)
+        for row, (start, end) in enumerate(chunks):
+            matrix[row] = self.embed(content[start:end])
+        
+        with self._lock:
+            self._save(name, matrix, chunks)
+            self._documents[name] = (matrix, chunks)
+            self._names.add(name)
+            self._stale = True
+    
+    def _stacked(self):
+        """The search matrix and chunk table, restacked after changes (lock held)"""
+        if self._stale:
+            documents = list(self._documents.items())
+            self.matrix = np.vstack([matrix for _, (matrix, _) in documents] or
+                                    [np.zeros((0, self.dimensions), dtype=np.float16)])
+            self.chunks = [(name, start, end) for name, (_, spans) in documents for start, end in spans]
+            self._stale = False
+        return self.matrix, self.chunks
+    
+    def search(self, query, top_k=3, min_score=0.15):
+        """Top-k chunks by cosine similarity: [{"filename", "start", "end", "score"}]"""
+        with self._lock:
+            matrix, chunks = self._stacked()
+        if not chunks or not query.strip():
+            return []
+        
+        scores = matrix @ self.embed(query)
+        top_k = min(top_k, len(chunks))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        
+        return [
+            {"filename": chunks[i][0], "start": chunks[i][1], "end": chunks[i][2],
+             "score": float(scores[i])}
+            for i in best if scores[i] >= min_score
+        ]
@@ -17,12 +17,18 @@ except ImportError:
     TTS_AVAILABLE = False
     pyttsx3 = None
 
+import queue
+import re
 import threading
 import time
 import os
 from logger import logger
 
 
+# End of a sentence in streamed text: terminal punctuation followed by whitespace
+SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+
 class VoiceInterface:
     """Voice interface with wake word detection"""
     
@@ -36,6 +42,11 @@ class VoiceInterface:
         self.awaiting_command = False
         self.available = False
         
+        # Streamed replies are spoken sentence by sentence, in order, by one worker
+        self._pending_speech = ""
+        self._speech_queue = queue.Queue()
+        self._speaker_thread = None
+        
         # Check if dependencies are available
         if not SPEECH_RECOGNITION_AVAILABLE or not TTS_AVAILABLE:
             logger.log_error("VOICE_INIT", "Voice dependencies not available", 
@@ -82,6 +93,51 @@ class VoiceInterface:
         except Exception as e:
             logger.log_error("TTS_SPEAK", str(e), text)
     
+    def speak_stream(self, text):
+        """Buffer streamed text and speak each sentence as soon as it is complete"""
+        if not self.available:
+            return
+        
+        self._pending_speech += text
+        last_end = None
+        for last_end in SENTENCE_END.finditer(self._pending_speech):
+            pass
+        if last_end:
+            self._queue_speech(self._pending_speech[:last_end.end()])
+            self._pending_speech = self._pending_speech[last_end.end():]
+    
+    def finish_stream(self):
+        """Speak whatever is left of a streamed reply"""
+        if not self.available:
+            return
+        
+        self._queue_speech(self._pending_speech)
+        self._pending_speech = ""
+    
+    def discard_stream(self):
+        """Drop what is left of a cancelled reply: its part-sentence and unspoken sentences"""
+        self._pending_speech = ""
+        while True:
+            try:
+                self._speech_queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def _queue_speech(self, text):
+        """Hand text to the speaker thread (started on first use)"""
+        text = text.strip()
+        if not text:
+            return
+        if self._speaker_thread is None:
+            self._speaker_thread = threading.Thread(target=self._speaker_loop, daemon=True)
+            self._speaker_thread.start()
+        self._speech_queue.put(text)
+    
+    def _speaker_loop(self):
+        """Speak queued sentences one after another"""
+        while True:
+            self.speak(self._speech_queue.get())
+    
     def listen_for_wake_word(self):
         """Continuously listen for wake word"""
         logger.log_action("wake_word_listening", "started", True)